@@ -0,0 +1,56 @@
+import threading
+
+import pygame
+
+# sprite sheets and frames cut out of them, loaded once and shared by the whole process
+sheets = {}
+frames = {}
+
+# thread loading assets ahead of time, e.g. while the menu is shown
+preloader = None
+
+
+def sheet(path):
+    """Loads an image only once, converted to the display format if the display is already set up"""
+    image = sheets.get(path)
+    if image is None:
+        image = pygame.image.load(path)
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+        sheets[path] = image
+    return image
+
+
+def frame(path, frame_rect, size, flipped=False):
+    """Part of a sheet (the whole sheet if frame_rect is None) scaled to given size, optionally flipped horizontally"""
+    key = (path, frame_rect, size, flipped)
+    image = frames.get(key)
+    if image is None:
+        image = sheet(path)
+        if frame_rect is not None:
+            image = image.subsurface(frame_rect)
+        image = pygame.transform.scale(image, size)
+        if flipped:
+            image = pygame.transform.flip(image, True, False)
+        frames[key] = image
+    return image
+
+
+def preload(paths, then=None):
+    """Loads sheets on a background thread, then calls given function (e.g. to prepare more); returns at once"""
+    global preloader
+
+    def load():
+        for path in paths:
+            sheet(path)
+        if then is not None:
+            then()
+
+    preloader = threading.Thread(target=load, name='assets preloader', daemon=True)
+    preloader.start()
+
+
+def wait_for_preload():
+    """Waits until preloading is finished, so that nothing is loaded twice at once"""
+    if preloader is not None:
+        preloader.join()
@@ -0,0 +1,342 @@
+import numpy as np
+
+import game
+from characters import Character, Directions, Pacman
+from collectibles import DotField
+from ghosts import Ghost, GhostNames
+from simulation import Simulation
+
+
+class BatchSimulation(object):
+    """Many independent headless games on one board layout, kept as NumPy arrays and advanced together.
+
+    Follows the rules of Simulation: entity 0 of every game is pacman, entities 1-4 are the ghosts
+    in GHOSTS order. Directions are stored as values of the Directions enum (0 means no direction).
+    """
+    GHOSTS = [GhostNames.inky, GhostNames.pinky, GhostNames.blinky, GhostNames.clyde]
+    ENTITIES = 1 + len(GHOSTS)
+
+    # per direction value lookups, index 0 stands for no direction
+    DIRECTION_X = np.array([0, 1, -1, 0, 0])
+    DIRECTION_Y = np.array([0, 0, 0, -1, 1])
+    DIRECTION_BITS = np.array([0] + [Directions.direction_bit(d) for d in Directions])
+    OPPOSITE = np.array([0] + [Directions.opposite_direction(d).value for d in Directions])
+
+    # ghosts consider directions in the same order as Ghost.update_direction, which decides ties
+    CANDIDATES = np.array([d.value for d in Character.DIRECTION_SWITCH_MAP])
+
+    def __init__(self, layout, batch_size, tile_size=game.TILE_SIZE, dt=Simulation.DEFAULT_DT):
+        self.layout = layout
+        self.batch_size = batch_size
+        self.tile_size = tile_size
+        self.dt = dt
+
+        self.prepare_grid()
+        self.prepare_dot_rects()
+
+        n = batch_size
+        self.positions = np.zeros((n, self.ENTITIES, 2))
+        self.tiles = np.zeros((n, self.ENTITIES, 2))
+        self.directions = np.zeros((n, self.ENTITIES), dtype=np.int8)
+        self.speeds = np.zeros((n, self.ENTITIES))
+        self.running = np.zeros((n, self.ENTITIES), dtype=bool)
+        self.last_teleport_time = np.zeros((n, self.ENTITIES))
+        self.direction_change_time = np.zeros((n, len(self.GHOSTS)))
+        self.ghosts_killing = np.zeros((n, len(self.GHOSTS)), dtype=bool)
+        self.pacman_killing = np.zeros(n, dtype=bool)
+
+        self.dots = np.zeros((n, self.cells), dtype=bool)
+        self.big_dots = np.zeros((n, self.cells), dtype=bool)
+
+        self.ticks = np.zeros(n)
+        self.frames = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.level_number = np.zeros(n, dtype=np.int64)
+        self.player_points = np.zeros(n, dtype=np.int64)
+        self.player_lives = np.zeros(n, dtype=np.int64)
+        self.killing_activated_time = np.zeros(n)
+        self.last_kill_time = np.zeros(n)
+        self.bonus_multiplier = np.zeros(n, dtype=np.int64)
+
+        self.reset()
+
+    # board grid shared by all the games
+    def prepare_grid(self):
+        layout = self.layout
+        self.cells = len(layout.tile_grid)
+
+        # one extra cell at the end stands for every tile outside of the grid
+        grid = np.frombuffer(bytes(layout.tile_grid), dtype=np.uint8)
+        self.ghost_path = np.append(grid & layout.TILE_GHOST_PATH != 0, False)
+        self.accessible_masks = np.append(np.frombuffer(bytes(layout.accessible_masks), dtype=np.uint8), 0)
+        self.passable_masks = np.append(np.frombuffer(bytes(layout.passable_masks), dtype=np.uint8), 0)
+
+        self.tunnel_exists = np.zeros(self.cells + 1, dtype=bool)
+        self.tunnel_targets = np.zeros((self.cells + 1, 2))
+        for start, end in layout.tunnel_map.items():
+            index = layout.tile_index(start)
+            if index is not None:
+                self.tunnel_exists[index] = True
+                self.tunnel_targets[index] = end
+
+        self.initial_dots = np.zeros(self.cells, dtype=bool)
+        self.initial_dots[[layout.tile_index(tile) for tile in layout.accessible]] = True
+        self.initial_big_dots = np.zeros(self.cells, dtype=bool)
+        self.initial_big_dots[[layout.tile_index(tile) for tile in layout.big_dots_indices]] = True
+
+        self.pacman_spawn = np.array(layout.spawn, dtype=float)
+        self.ghost_spawns = np.array([layout.ghost_spawns.get(name) for name in self.GHOSTS], dtype=float)
+
+        width, height = layout.layout_size
+        scatter_tiles = {GhostNames.inky: (width - 1, height - 1), GhostNames.pinky: (0, 0),
+                         GhostNames.blinky: (width - 1, 0), GhostNames.clyde: (0, height - 1)}
+        self.scatter_tiles = np.array([scatter_tiles.get(name) for name in self.GHOSTS], dtype=float)
+
+    def prepare_dot_rects(self):
+        # rectangles of dots in every cell, truncated the same way as pygame.Rect does it
+        columns = np.arange(self.cells) % self.layout.grid_width - self.layout.GRID_PADDING
+        rows = np.arange(self.cells) // self.layout.grid_width - self.layout.GRID_PADDING
+
+        def rects(size):
+            x = np.trunc((columns + 0.5) * self.tile_size - size / 2)
+            y = np.trunc((rows + 0.5) * self.tile_size - size / 2)
+            return x, y, size
+
+        self.dot_rects = rects(self.tile_size // DotField.DOT_SIZE_DIVIDER)
+        self.big_dot_rects = rects(self.tile_size // DotField.BIG_DOT_SIZE_DIVIDER)
+
+    def tile_indices(self, tiles):
+        x = tiles[..., 0].astype(np.int64) + self.layout.GRID_PADDING
+        y = tiles[..., 1].astype(np.int64) + self.layout.GRID_PADDING
+        inside = (x >= 0) & (x < self.layout.grid_width) & (y >= 0) & (y < self.layout.grid_height)
+        return np.where(inside, y * self.layout.grid_width + x, self.cells)
+
+    def tile_centers(self, tiles):
+        return (tiles + 0.5) * self.tile_size
+
+    def get_ticks(self):
+        return np.trunc(self.ticks)
+
+    # resetting whole games
+    def reset(self, games=None):
+        """Starts new games in place of the selected ones (all of them by default)"""
+        games = np.ones(self.batch_size, dtype=bool) if games is None else games
+
+        self.ticks[games] = 0
+        self.frames[games] = 0
+        self.game_over[games] = False
+        self.level_number[games] = 1
+        self.player_points[games] = 0
+        self.player_lives[games] = game.GameStatus.MAX_LIVES
+        self.last_teleport_time[games] = 0
+        self.direction_change_time[games] = 0
+        self.reset_level(games)
+
+        # pacman starts the game already running
+        self.running[games, 0] = True
+
+    def reset_level(self, games):
+        self.killing_activated_time[games] = np.nan
+        self.last_kill_time[games] = np.nan
+        self.bonus_multiplier[games] = 0
+        self.speeds[games, 0] = Character.BASE_SPEED
+        self.speeds[games, 1:] = Ghost.SPEED
+        self.dots[games] = self.initial_dots
+        self.big_dots[games] = self.initial_big_dots
+        self.restart_characters_positions(games)
+
+    def restart_characters_positions(self, games):
+        self.tiles[games, 0] = self.pacman_spawn
+        self.running[games, 0] = False
+        self.pacman_killing[games] = False
+        self.tiles[games, 1:] = self.ghost_spawns
+        self.ghosts_killing[games] = True
+        self.directions[games] = Directions.UP.value
+        self.positions[games] = self.tile_centers(self.tiles[games])
+
+    # a single frame of every game
+    def step(self, directions=None, dt=None):
+        """Advances every unfinished game by a frame; directions holds requested pacman directions (0 for none)"""
+        dt = self.dt if dt is None else dt
+        active = ~self.game_over
+        self.ticks[active] += dt * game.Game.TICKS_PER_SEC
+        self.frames[active] += 1
+
+        if directions is not None:
+            self.change_pacman_direction(np.asarray(directions), active)
+
+        self.move(0, dt, active)
+        self.update_ghosts_directions(active)
+        self.move(slice(1, None), dt, active)
+        self.check_or_deactivate_pacman_killing(active)
+        alive = self.update_collisions(active)
+        self.update_dots(active & alive)
+
+    def run(self, policy, frames):
+        """Advances the batch for given number of frames, asking policy for an array of pacman directions"""
+        for _ in range(frames):
+            if self.game_over.all():
+                break
+            self.step(policy(self))
+
+    def safe_to_change_direction(self, entities):
+        margin = self.tile_size / 15
+        distance = np.abs(self.tile_centers(self.tiles[:, entities]) - self.positions[:, entities])
+        return (distance < margin).all(axis=-1)
+
+    def change_pacman_direction(self, directions, active):
+        masks = self.passable_masks[self.tile_indices(self.tiles[:, 0])]
+        allowed = active & (directions > 0) & (masks & self.DIRECTION_BITS[directions] != 0) & \
+            self.safe_to_change_direction(0)
+        self.running[allowed, 0] = True
+        self.directions[allowed, 0] = directions[allowed]
+
+    def move(self, entities, dt, active):
+        tiles = self.tiles[:, entities]
+        positions = self.positions[:, entities]
+        last_teleport_time = self.last_teleport_time[:, entities]
+        active = active if np.ndim(tiles) == 2 else active[:, None]
+
+        # using tunnels on boards
+        time = self.get_ticks() if np.ndim(tiles) == 2 else self.get_ticks()[:, None]
+        indices = self.tile_indices(tiles)
+        teleport = active & self.tunnel_exists[indices] & \
+            (np.abs(time - last_teleport_time) > Character.TELEPORT_TIME_GAP)
+        last_teleport_time[teleport] = np.broadcast_to(time, teleport.shape)[teleport]
+        tiles[teleport] = self.tunnel_targets[indices[teleport]]
+        positions[teleport] = self.tile_centers(tiles[teleport])
+
+        directions = self.directions[:, entities]
+        switch = np.stack([self.DIRECTION_X[directions], self.DIRECTION_Y[directions]], axis=-1)
+        passable = self.passable_masks[self.tile_indices(tiles)] & self.DIRECTION_BITS[directions] != 0
+        reach_center = ((self.tile_centers(tiles) - positions) * switch).sum(axis=-1) > 0
+        running = passable | reach_center
+
+        moving = active & running
+        speeds = self.speeds[:, entities]
+        positions[moving] += switch[moving] * (speeds[moving] * dt)[..., None]
+        tiles[moving] = positions[moving] // self.tile_size
+
+        self.running[:, entities] = np.where(active, running, self.running[:, entities])
+        self.tiles[:, entities] = tiles
+        self.positions[:, entities] = positions
+        self.last_teleport_time[:, entities] = last_teleport_time
+
+    # ghosts AI
+    def chase_tiles(self):
+        pacman_tiles = self.tiles[:, 0]
+        pacman_switch = np.stack([self.DIRECTION_X[self.directions[:, 0]],
+                                  self.DIRECTION_Y[self.directions[:, 0]]], axis=-1)
+        blinky_tiles = self.tiles[:, 1 + self.GHOSTS.index(GhostNames.blinky)]
+        clyde_tiles = self.tiles[:, 1 + self.GHOSTS.index(GhostNames.clyde)]
+
+        chase = {
+            GhostNames.blinky: pacman_tiles,
+            GhostNames.pinky: pacman_tiles + 4 * pacman_switch,
+            GhostNames.inky: blinky_tiles + 2 * (pacman_tiles + 2 * pacman_switch - blinky_tiles),
+            GhostNames.clyde: np.where(
+                (np.sqrt(((clyde_tiles - pacman_tiles) ** 2).sum(axis=-1)) < 8)[:, None],
+                self.scatter_tiles[self.GHOSTS.index(GhostNames.clyde)], pacman_tiles)
+        }
+        chase_tiles = np.stack([chase.get(name) for name in self.GHOSTS], axis=1)
+        return np.where(self.ghosts_killing[..., None], chase_tiles, self.scatter_tiles)
+
+    def update_ghosts_directions(self, active):
+        time = self.get_ticks()[:, None]
+        tiles = self.tiles[:, 1:]
+        directions = self.directions[:, 1:]
+        deciding = active[:, None] & (time - self.direction_change_time >= Ghost.DIRECTION_CHANGE_TIME_GAP) & \
+            self.safe_to_change_direction(slice(1, None))
+
+        # distances from every candidate tile to the chase tile, infinite for forbidden directions
+        indices = self.tile_indices(tiles)
+        candidates = self.CANDIDATES
+        candidate_tiles = tiles[..., None, :] + np.stack([self.DIRECTION_X[candidates],
+                                                          self.DIRECTION_Y[candidates]], axis=-1)
+        allowed = (self.accessible_masks[indices][..., None] & self.DIRECTION_BITS[candidates] != 0) & \
+            (candidates != self.OPPOSITE[directions][..., None])
+        distances = np.sqrt(((candidate_tiles - self.chase_tiles()[..., None, :]) ** 2).sum(axis=-1))
+        distances = np.where(allowed, distances, np.inf)
+
+        chosen = candidates[distances.argmin(axis=-1)]
+        dead_end = ~allowed.any(axis=-1)
+        chosen = np.where(dead_end, np.where(self.ghost_path[indices], directions, self.OPPOSITE[directions]), chosen)
+
+        self.directions[:, 1:] = np.where(deciding, chosen, directions)
+        self.direction_change_time[:] = np.where(deciding, time, self.direction_change_time)
+
+    # game mechanics
+    def check_or_deactivate_pacman_killing(self, active):
+        expired = active & self.pacman_killing & ~np.isnan(self.killing_activated_time) & \
+            ((self.get_ticks() - self.killing_activated_time) / 1000 > game.GameStatus.KILLING_DURATION)
+        self.pacman_killing[expired] = False
+        self.speeds[expired, 0] -= Pacman.SPEED_BONUS
+        self.ghosts_killing[expired] = True
+
+    def update_collisions(self, active):
+        # returns mask of games in which pacman has not been killed
+        # squared distances, compared the same way as by characters
+        squared_distances = ((self.positions[:, 1:] - self.positions[:, :1]) ** 2).sum(axis=-1)
+        colliding = active[:, None] & (squared_distances <= (self.tile_size / 2.0) ** 2)
+        any_colliding = colliding.any(axis=1)
+
+        killing = any_colliding & self.pacman_killing
+        time = self.get_ticks()
+        for ghost in range(len(self.GHOSTS)):
+            killed = killing & colliding[:, ghost]
+            in_bonus = ~np.isnan(self.last_kill_time) & \
+                (np.abs(time - self.last_kill_time) / 1000 < game.GameStatus.KILLING_BONUS_DURATION)
+            self.bonus_multiplier[killed] = np.where(in_bonus[killed], self.bonus_multiplier[killed] + 1, 1)
+            self.killing_activated_time[killed] += 500
+            self.last_kill_time[killed] = time[killed]
+            self.player_points[killed] += game.GameStatus.GHOST_EATEN_POINTS * self.bonus_multiplier[killed]
+
+            self.tiles[killed, 1 + ghost] = self.ghost_spawns[ghost]
+            self.positions[killed, 1 + ghost] = self.tile_centers(self.ghost_spawns[ghost])
+            self.directions[killed, 1 + ghost] = Directions.UP.value
+
+        killed = any_colliding & ~self.pacman_killing
+        self.player_lives[killed] -= 1
+        self.game_over |= killed & (self.player_lives == 0)
+        self.restart_characters_positions(killed & ~self.game_over)
+        return ~killed
+
+    def eat_dots(self, dots, rects, active):
+        # pacman is exactly one tile wide, so only dots on its own and adjacent tiles can be touched
+        x, y, size = rects
+        width = self.tile_size
+        left = np.trunc(self.positions[:, 0, 0] - width / 2)
+        top = np.trunc(self.positions[:, 0, 1] - width / 2)
+        games = np.arange(self.batch_size)
+
+        eaten = np.zeros(self.batch_size, dtype=np.int64)
+        for i in (-1, 0, 1):
+            for j in (-1, 0, 1):
+                indices = self.tile_indices(self.tiles[:, 0] + (i, j))
+                inside = indices < self.cells
+                indices = np.where(inside, indices, 0)
+                touched = active & inside & dots[games, indices] & \
+                    (left < x[indices] + size) & (x[indices] < left + width) & \
+                    (top < y[indices] + size) & (y[indices] < top + width)
+                dots[games[touched], indices[touched]] = False
+                eaten += touched
+        return eaten
+
+    def update_dots(self, active):
+        dots_no = self.eat_dots(self.dots, self.dot_rects, active)
+        big_dots_no = self.eat_dots(self.big_dots, self.big_dot_rects, active)
+        self.player_points += dots_no * game.GameStatus.DOT_POINTS + big_dots_no * game.GameStatus.BIG_DOT_POINTS
+
+        # activate pacman killing
+        killing = big_dots_no > 0
+        self.ghosts_killing[killing] = False
+        self.directions[killing, 1:] = self.OPPOSITE[self.directions[killing, 1:]]
+        self.direction_change_time[killing] = self.get_ticks()[killing, None]
+        self.pacman_killing[killing] = True
+        self.speeds[killing, 0] += Pacman.SPEED_BONUS
+        self.killing_activated_time[killing] = self.get_ticks()[killing]
+
+        # advance to next level when there are no dots left
+        finished = active & ~(self.dots.any(axis=1) | self.big_dots.any(axis=1))
+        self.level_number[finished] += 1
+        self.reset_level(finished)
@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import pygame
+
+import board
+import game
+import network
+from characters import Directions
+from environment import BatchEnvironment, Environment
+from ghosts import Ghost, GhostNames
+from maze_generator import MazeGenerator
+from simulation import Simulation
+
+LAYOUTS = ['classic', 'prim', 'wall']
+SEEDS = range(5)
+MAZE_SIZES = [board.GeneratedLayout.SIZE, (99, 99)]
+GAME_FRAMES = 900
+SIMULATION_FRAMES = 3000
+BACKGROUND_BUILDS = 20
+ENVIRONMENT_BATCH_SIZE = 256
+
+
+def scripted_direction(frame):
+    # turns every 40 frames, so pacman keeps visiting new parts of the board
+    return [Directions.LEFT, Directions.UP, Directions.RIGHT, Directions.DOWN][(frame // 40) % 4]
+
+
+def prepare_layout(layout_type, seed=0):
+    return board.ClassicLayout() if layout_type == 'classic' else board.GeneratedLayout(layout_type, seed=seed)
+
+
+def game_frame(screen, layout_type):
+    """Time (ms) of one frame of the game: a single step of game logic and drawing of characters"""
+    game_instance = game.Game(screen, pygame.time.Clock(), game.TILE_SIZE, prepare_layout(layout_type))
+    game_instance.alive_group.clear(screen, game_instance.dots.layer)
+    game_instance.refresh_game_screen()
+
+    start = time.perf_counter()
+    for frame in range(GAME_FRAMES):
+        game_instance.player.change_direction(scripted_direction(frame))
+        game_instance.step()
+        game_instance.draw_sprites(1.0)
+        game_instance.pause = False
+        game_instance.status.player_lives = game.GameStatus.MAX_LIVES  # the scenario never ends
+    return 1000 * (time.perf_counter() - start) / GAME_FRAMES
+
+
+def maze_generation(model, size):
+    """Time (ms) of generating a maze model, averaged over seeds"""
+    start = time.perf_counter()
+    for seed in SEEDS:
+        generator = MazeGenerator(size, seed)
+        if model == 'prim':
+            generator.prepare_prim_model()
+        else:
+            generator.prepare_wall_model()
+    return 1000 * (time.perf_counter() - start) / len(SEEDS)
+
+
+def background_build(screen, layout_type):
+    """Time (ms) of rendering the background of a board, with the backgrounds cache emptied before every build"""
+    layout = prepare_layout(layout_type)
+    elapsed = 0.0
+    for _ in range(BACKGROUND_BUILDS):
+        board.backgrounds_cache.clear()
+        start = time.perf_counter()
+        board.Board(game.TILE_SIZE, screen, layout)
+        elapsed += time.perf_counter() - start
+    return 1000 * elapsed / BACKGROUND_BUILDS
+
+
+def ghost_decision(layout_type, shortest_path_targeting=False):
+    """Time (us) of the AI of a single ghost (choosing its target and direction) per frame of a scripted game"""
+    simulation = Simulation(prepare_layout(layout_type), shortest_path_targeting=shortest_path_targeting)
+    simulation.reset()
+    ghosts = list(simulation.monsters.values())
+    blinky = simulation.monsters.get(GhostNames.blinky)
+
+    elapsed = 0.0
+    decisions = 0
+    for frame in range(SIMULATION_FRAMES):
+        if simulation.game_over:
+            simulation.reset()
+        simulation.player.change_direction(scripted_direction(frame))
+        simulation.player.move(simulation.dt)
+        simulation.player.set_rect()
+
+        start = time.perf_counter()
+        Ghost.ai_tick(ghosts, simulation.player, blinky)
+        elapsed += time.perf_counter() - start
+        decisions += len(ghosts)
+
+        for ghost in ghosts:
+            ghost.move(simulation.dt)
+        simulation.ticks += simulation.dt * game.Game.TICKS_PER_SEC
+        if simulation.update_collisions():
+            simulation.update_dots()
+    return 1000000 * elapsed / decisions
+
+
+def network_session(layout_type, measure_bandwidth=False):
+    """Time (us) of a server tick of a single session (a step of its game and snapshots for both players),
+    or the number of bytes sent to one of the players per second of the game"""
+    simulation = Simulation(prepare_layout(layout_type))
+    simulation.reset()
+    encoders = [network.SnapshotEncoder(simulation) for _ in range(2)]
+
+    sent = 0
+    start = time.perf_counter()
+    for frame in range(SIMULATION_FRAMES):
+        simulation.step(scripted_direction(frame))
+        if simulation.game_over:
+            simulation.reset()
+        if frame % network.SNAPSHOT_STEPS == 0:
+            for encoder in encoders:
+                snapshot = encoder.encode(frame)
+                if snapshot is not None and encoder is encoders[0]:
+                    sent += len(network.pack_message(network.SNAPSHOT, snapshot))
+    if measure_bandwidth:
+        return sent / (SIMULATION_FRAMES * game.Game.STEP_DT)
+    return 1000000 * (time.perf_counter() - start) / SIMULATION_FRAMES
+
+
+def environment_step(layout_type, batch_size=None):
+    """Time (us) of a step of the environment of a single game (or of a batch of games, per game), observations
+    included, so it can be compared with the simulation alone"""
+    layout = prepare_layout(layout_type)
+    if batch_size is None:
+        single = Environment(layout)
+        single.reset()
+        start = time.perf_counter()
+        for frame in range(SIMULATION_FRAMES):
+            if single.step(scripted_direction(frame).value)[2]:
+                single.reset()
+        return 1000000 * (time.perf_counter() - start) / SIMULATION_FRAMES
+
+    batch = BatchEnvironment(layout, batch_size)
+    actions = np.zeros(batch_size, dtype=np.int8)
+    frames = SIMULATION_FRAMES // 10
+    start = time.perf_counter()
+    for frame in range(frames):
+        actions[:] = scripted_direction(frame).value
+        dones = batch.step(actions)[2]
+        if dones.any():
+            batch.reset(dones)
+    return 1000000 * (time.perf_counter() - start) / (frames * batch_size)
+
+
+def prepare_benchmarks(screen):
+    """Benchmarks by name, as (function, unit), lower results are always better"""
+    benchmarks = {}
+    for layout_type in LAYOUTS:
+        benchmarks['game_frame/%s' % layout_type] = (lambda l=layout_type: game_frame(screen, l), 'ms')
+        benchmarks['background/%s' % layout_type] = (lambda l=layout_type: background_build(screen, l), 'ms')
+        benchmarks['ghost_decision/%s' % layout_type] = (lambda l=layout_type: ghost_decision(l), 'us')
+        benchmarks['ghost_decision_shortest_path/%s' % layout_type] = \
+            (lambda l=layout_type: ghost_decision(l, True), 'us')
+        benchmarks['network_tick/%s' % layout_type] = (lambda l=layout_type: network_session(l), 'us')
+        benchmarks['network_bandwidth/%s' % layout_type] = (lambda l=layout_type: network_session(l, True), 'B/s')
+        benchmarks['environment_step/%s' % layout_type] = (lambda l=layout_type: environment_step(l), 'us')
+        benchmarks['batch_environment_step/%s' % layout_type] = \
+            (lambda l=layout_type: environment_step(l, ENVIRONMENT_BATCH_SIZE), 'us')
+    for model in ['prim', 'wall']:
+        for size in MAZE_SIZES:
+            benchmarks['maze/%s/%dx%d' % ((model,) + tuple(size))] = \
+                (lambda m=model, s=size: maze_generation(m, s), 'ms')
+    return benchmarks
+
+
+def run_benchmarks(benchmarks, repeat, stream):
+    results = {}
+    for name, (function, unit) in benchmarks.items():
+        function()  # warm up, e.g. fill caches of loaded images
+        samples = [function() for _ in range(repeat)]
+        results[name] = {'median': statistics.median(samples), 'min': min(samples), 'unit': unit, 'samples': samples}
+        stream.write('%-45s %10.3f %s (min %.3f)\n' % (name, results[name]['median'], unit, results[name]['min']))
+        stream.flush()
+    return results
+
+
+def compare(results, baseline, threshold, stream):
+    """Prints the change of every benchmark against the baseline, returns names of the regressed ones"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            stream.write('%-45s %10s\n' % (name, 'new'))
+            continue
+        before = baseline[name]['median']
+        change = (result['median'] - before) / before if before > 0 else 0.0
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        stream.write('%-45s %10.3f -> %10.3f %s %+7.1f%%%s\n' % (
+            name, before, result['median'], result['unit'], 100 * change, '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'processor': platform.processor()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measures performance of the game, run under the SDL dummy driver.')
+    parser.add_argument('--only', nargs='+', default=None, help='runs benchmarks whose names start with any of these')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of every benchmark, the median is reported')
+    parser.add_argument('--output', default=None, help='file the results are saved to (as a JSON baseline)')
+    parser.add_argument('--compare', default=None, metavar='BASELINE', help='baseline file to compare the results to')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown (against the baseline) treated as a regression')
+    arguments = parser.parse_args(argv)
+
+    # benchmarks never open a window, so results do not depend on the window system
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    pygame.init()
+    screen = pygame.display.set_mode(game.SCREEN_RESOLUTION)
+
+    benchmarks = prepare_benchmarks(screen)
+    if arguments.only:
+        benchmarks = {name: benchmark for name, benchmark in benchmarks.items()
+                      if any(name.startswith(prefix) for prefix in arguments.only)}
+
+    results = run_benchmarks(benchmarks, arguments.repeat, sys.stdout)
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump({'environment': environment(), 'results': results}, output_file, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(results, baseline, arguments.threshold, sys.stdout)
+        if regressions:
+            sys.stdout.write('%d benchmark(s) slower by more than %.0f%%\n' % (len(regressions),
+                                                                              100 * arguments.threshold))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
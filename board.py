@@ -1,14 +1,26 @@
-import random
+import os
+from collections import OrderedDict
 
 import pygame
 
-import collectibles
-import game
+import assets
+import broadphase
+import characters
+import pathfinding
+from ghosts import GhostNames
 from maze_generator import MazeGenerator
 
+# rendered backgrounds of recently used boards, by (layout hash, tile size, screen size)
+backgrounds_cache = OrderedDict()
+BACKGROUNDS_CACHE_SIZE = 8
+
+# when set (with --backgrounds-cache of game.py), rendered backgrounds are also kept between runs in this directory,
+# as raw RGB pixel dumps
+backgrounds_directory = None
+
 
 class Board(object):
-    TILES = pygame.image.load('./tileset/warTileset_64x64.png')
+    TILES_PATH = './tileset/warTileset_64x64.png'
     TILE_X = 64  # the size of tile loaded from .png, in px
     TILES_IN_ROW = 6
     NO_TILES = 23
@@ -17,20 +29,34 @@ class Board(object):
     BACKGROUND_TILE = 0
     GHOST_HOUSE_TILE = 4
 
-    def __init__(self, tile_size, game_screen, layout):
+    def __init__(self, tile_size, game_screen, layout, shortest_path_targeting=False):
         self.tile_size = tile_size
         self.game_screen = game_screen
         self.board_layout = layout
-        self.background = self.prepare_background()
+
+        # headless boards (without a screen) are never drawn, boards larger than the screen are drawn in chunks
+        self.background = self.prepare_background() if game_screen is not None and self.fits_screen() else None
+
+        # time source (in ms) of characters on this board, replaced by the headless simulation
+        self.get_ticks = pygame.time.get_ticks
+
+        # when set, ghosts measure distances to their targets along the maze instead of in a straight line
+        self.distance_fields = pathfinding.DistanceFields(layout) if shortest_path_targeting else None
+
+        # characters on this board by the tiles they are on, for finding collisions
+        self.characters = broadphase.TileBuckets()
+
+        # directions chosen by ghosts, by their tile, direction and target tile
+        self.ghost_directions = OrderedDict()
 
     @staticmethod
-    def get_tile(tile_number):
+    def get_tile_rect(tile_number):
         tile_number %= Board.NO_TILES
 
         column = tile_number % Board.TILES_IN_ROW
         row = tile_number // Board.TILES_IN_ROW
 
-        return Board.TILES.subsurface(column * Board.TILE_X, row * Board.TILE_X, Board.TILE_X, Board.TILE_X)
+        return column * Board.TILE_X, row * Board.TILE_X, Board.TILE_X, Board.TILE_X
 
     @staticmethod
     def are_adjacent_tiles(tile1, tile2):
@@ -42,40 +68,91 @@ class Board(object):
             return False
 
     def get_tile_scaled(self, tile_number):
-        return pygame.transform.scale(Board.get_tile(tile_number), (self.tile_size, self.tile_size))
+        return assets.frame(Board.TILES_PATH, Board.get_tile_rect(tile_number), (self.tile_size, self.tile_size))
 
-    def prepare_background(self):
-        background = pygame.Surface(self.game_screen.get_size())
-        for (i, j) in self.board_layout.walls:
-            background.blit(self.get_tile_scaled(Board.BACKGROUND_TILE), (i * self.tile_size, j * self.tile_size))
+    def fits_screen(self):
+        screen_width, screen_height = self.game_screen.get_size()
+        return self.board_layout.layout_size[0] * self.tile_size <= screen_width and \
+            self.board_layout.layout_size[1] * self.tile_size <= screen_height
 
-        for (i, j) in self.board_layout.ghost_house:
-            ghost_house_tile = self.get_tile_scaled(Board.GHOST_HOUSE_TILE)
-            ghost_house_tile.set_alpha(10)
-            background.blit(ghost_house_tile, (i * self.tile_size, j * self.tile_size))
+    def prepare_background(self):
+        # backgrounds are shared between boards with the same layout, they must not be drawn on
+        key = (self.board_layout.layout_hash(), self.tile_size) + tuple(self.game_screen.get_size())
+        background = backgrounds_cache.get(key)
+        if background is None:
+            background = self.load_background(key)
+        if background is None:
+            background = self.render_background()
+            self.save_background(key, background)
+
+        backgrounds_cache[key] = background
+        backgrounds_cache.move_to_end(key)
+        while len(backgrounds_cache) > BACKGROUNDS_CACHE_SIZE:
+            backgrounds_cache.popitem(last=False)
+        return background
 
+    def render_background(self):
+        background = pygame.Surface(self.game_screen.get_size())
+        self.draw_background_tiles(background, pygame.Rect((0, 0), self.board_layout.layout_size))
         return background
 
-    def prepare_dots(self):
-        dots_group = pygame.sprite.LayeredDirty()
-        for (x, y) in self.board_layout.accessible:
-            collectibles.Dot(x, y, self.tile_size, dots_group)
-        return dots_group
+    @staticmethod
+    def background_path(key):
+        return os.path.join(backgrounds_directory, '%s_%d_%dx%d.raw' % key)
+
+    def load_background(self, key):
+        if backgrounds_directory is None or not os.path.exists(Board.background_path(key)):
+            return None
+        with open(Board.background_path(key), 'rb') as background_file:
+            pixels = background_file.read()
+        size = self.game_screen.get_size()
+        if len(pixels) != size[0] * size[1] * 3:
+            return None
+        background = pygame.image.fromstring(pixels, size, 'RGB')
+        return background.convert() if pygame.display.get_surface() is not None else background
 
-    def prepare_big_dots(self):
-        big_dots_group = pygame.sprite.LayeredDirty()
-        for (x, y) in self.board_layout.big_dots_indices:
-            collectibles.BigDot(x, y, self.tile_size, big_dots_group)
-        return big_dots_group
+    @staticmethod
+    def save_background(key, background):
+        if backgrounds_directory is None:
+            return
+        os.makedirs(backgrounds_directory, exist_ok=True)
+        # written aside and renamed, so other processes never read a partial dump
+        temporary_path = Board.background_path(key) + '.%d' % os.getpid()
+        with open(temporary_path, 'wb') as background_file:
+            background_file.write(pygame.image.tostring(background, 'RGB'))
+        os.replace(temporary_path, Board.background_path(key))
+
+    def draw_background_tiles(self, surface, tiles_rect):
+        """Draws walls and ghost house lying in given rectangle of tiles, its top left tile at (0, 0) of surface"""
+        wall_tile = self.get_tile_scaled(Board.BACKGROUND_TILE)
+        ghost_house_tile = self.get_tile_scaled(Board.GHOST_HOUSE_TILE).copy()  # cached tiles are shared
+        ghost_house_tile.set_alpha(10)
+
+        for i in range(tiles_rect.left, tiles_rect.right):
+            for j in range(tiles_rect.top, tiles_rect.bottom):
+                tile_class = self.board_layout.tile_class((i, j))
+                position = ((i - tiles_rect.left) * self.tile_size, (j - tiles_rect.top) * self.tile_size)
+                if tile_class & BoardLayout.TILE_WALL:
+                    surface.blit(wall_tile, position)
+                if tile_class & BoardLayout.TILE_GHOST_HOUSE:
+                    surface.blit(ghost_house_tile, position)
 
     def teleport_available(self, position_tile):
-        for (start_tile, end_tile) in self.board_layout.tunnels:
-            if position_tile == start_tile:
-                return end_tile
-        return None
+        return self.board_layout.tunnel_map.get(position_tile)
 
 
 class BoardLayout:
+    # tile classes stored in the grid (bit flags, tiles outside of the maze have none)
+    TILE_EMPTY = 0
+    TILE_ACCESSIBLE = 1
+    TILE_GHOST_HOUSE = 2
+    TILE_GHOST_PATH = 4
+    TILE_TUNNEL = 8
+    TILE_WALL = 16
+
+    # the grid has one tile of padding on every side, so tunnel ends outside the playable area fit in it
+    GRID_PADDING = 1
+
     def __init__(self, wall_indices, accessible_indices,
                  ghost_spawn_map, ghost_house_indices, ghost_path_indices,
                  spawn_index, tunnel_indices, big_dots_indices, size):
@@ -90,6 +167,95 @@ class BoardLayout:
 
         self.spawn = spawn_index
         self.tunnels = tunnel_indices
+        self.tunnel_map = dict(tunnel_indices)
+
+        # array-backed tile grid and per tile masks of neighbours (one bit per direction)
+        self.grid_width = size[0] + 2 * BoardLayout.GRID_PADDING
+        self.grid_height = size[1] + 2 * BoardLayout.GRID_PADDING
+        self.tile_grid = self.prepare_tile_grid()
+        self.tile_grid_hash = None
+        self.accessible_masks, self.passable_masks = self.prepare_neighbour_masks()
+
+    def tile_index(self, tile):
+        x = int(tile[0]) + BoardLayout.GRID_PADDING
+        y = int(tile[1]) + BoardLayout.GRID_PADDING
+        if 0 <= x < self.grid_width and 0 <= y < self.grid_height:
+            return y * self.grid_width + x
+        return None
+
+    def grid_tile(self, index):
+        """Tile under given index of the grid, the reverse of tile_index"""
+        return index % self.grid_width - BoardLayout.GRID_PADDING, index // self.grid_width - BoardLayout.GRID_PADDING
+
+    def layout_hash(self):
+        """Identifies the layout by its tiles, it is the same for equal layouts in different processes"""
+        if self.tile_grid_hash is None:
+            import hashlib  # loading OpenSSL takes a few ms, not worth it for headless boards, which are never hashed
+
+            self.tile_grid_hash = hashlib.md5(self.grid_width.to_bytes(4, 'little') + self.tile_grid).hexdigest()
+        return self.tile_grid_hash
+
+    def tile_class(self, tile):
+        index = self.tile_index(tile)
+        return BoardLayout.TILE_EMPTY if index is None else self.tile_grid[index]
+
+    def is_accessible(self, tile):
+        return self.tile_class(tile) & BoardLayout.TILE_ACCESSIBLE != 0
+
+    def is_ghost_path(self, tile):
+        return self.tile_class(tile) & BoardLayout.TILE_GHOST_PATH != 0
+
+    def accessible_directions(self, tile):
+        # mask of directions leading to regular accessible tiles, used by the ghosts AI
+        index = self.tile_index(tile)
+        return 0 if index is None else self.accessible_masks[index]
+
+    def passable_directions(self, tile):
+        # mask of directions a character standing on the tile is allowed to move in
+        index = self.tile_index(tile)
+        return 0 if index is None else self.passable_masks[index]
+
+    def prepare_tile_grid(self):
+        tile_grid = bytearray(self.grid_width * self.grid_height)
+
+        def mark(tiles, tile_class):
+            for tile in tiles:
+                index = self.tile_index(tile)
+                if index is not None:
+                    tile_grid[index] |= tile_class
+
+        mark(self.walls, BoardLayout.TILE_WALL)
+        mark(self.accessible, BoardLayout.TILE_ACCESSIBLE)
+        mark(self.ghost_house, BoardLayout.TILE_GHOST_HOUSE)
+        mark(self.ghost_path, BoardLayout.TILE_GHOST_PATH)
+        mark([tile for tunnel in self.tunnels for tile in tunnel], BoardLayout.TILE_TUNNEL)
+        return tile_grid
+
+    def prepare_neighbour_masks(self):
+        accessible_masks = bytearray(len(self.tile_grid))
+        passable_masks = bytearray(len(self.tile_grid))
+        enterable = BoardLayout.TILE_ACCESSIBLE | BoardLayout.TILE_TUNNEL
+
+        # neighbours as (direction bit, x offset, offset in the grid)
+        neighbours = [(characters.Directions.direction_bit(direction), dx, dy * self.grid_width + dx)
+                      for direction, (dx, dy) in characters.Character.DIRECTION_SWITCH_MAP.items()]
+
+        for index, tile_class in enumerate(self.tile_grid):
+            x = index % self.grid_width
+            for bit, dx, offset in neighbours:
+                next_index = index + offset
+                if not (0 <= x + dx < self.grid_width and 0 <= next_index < len(self.tile_grid)):
+                    continue
+
+                next_class = self.tile_grid[next_index]
+                if next_class & BoardLayout.TILE_ACCESSIBLE:
+                    accessible_masks[index] |= bit
+                # ghosts may move freely between ghost path tiles (leaving the ghost house)
+                if next_class & enterable or \
+                        tile_class & next_class & BoardLayout.TILE_GHOST_PATH:
+                    passable_masks[index] |= bit
+
+        return accessible_masks, passable_masks
 
 
 class ClassicLayout(BoardLayout):
@@ -156,10 +322,10 @@ class ClassicLayout(BoardLayout):
         accessible_indices += big_dots_indices
 
         ghost_spawn_map = {
-            game.GhostNames.inky: (13, 14),
-            game.GhostNames.pinky: (14, 14),
-            game.GhostNames.blinky: (13, 15),
-            game.GhostNames.clyde: (14, 15)
+            GhostNames.inky: (13, 14),
+            GhostNames.pinky: (14, 14),
+            GhostNames.blinky: (13, 15),
+            GhostNames.clyde: (14, 15)
         }
 
         spawn_index = (14, 23)
@@ -176,8 +342,12 @@ class ClassicLayout(BoardLayout):
 class GeneratedLayout(BoardLayout):
     SIZE = (28, 31)
 
-    def __init__(self, type):
-        generator = MazeGenerator()
+    def __init__(self, type, size=SIZE, seed=None):
+        # the same type, size and seed always give the same layout
+        self.type = type
+        self.seed = seed
+
+        generator = MazeGenerator(size, seed)
         if type == 'prim':
             generator.prepare_prim_model()
         elif type == 'wall':
@@ -185,27 +355,44 @@ class GeneratedLayout(BoardLayout):
 
         self.model = generator.maze_model
 
-        walls = [(i, j) for i in range(self.SIZE[0]) for j in range(self.SIZE[1]) if self.model[j][i] == 1]
+        accessible = [(i, j) for i in range(size[0]) for j in range(size[1]) if self.model[j][i] == 0]
 
-        ghost_house = []
+        big_dots = [accessible[generator.random.randint(0, len(accessible) - 1)] for i in range(4)]
 
-        ghost_path = []
+        possible_ghost_spawn = [accessible[generator.random.randint(0, len(accessible) - 1)] for i in range(4)]
 
-        accessible = [(i, j) for i in range(self.SIZE[0]) for j in range(self.SIZE[1]) if self.model[j][i] == 0]
+        possible_spawn = [x for x in accessible if x not in possible_ghost_spawn]
+        spawn = possible_spawn[generator.random.randint(0, len(possible_spawn) - 1)]
 
-        big_dots = [accessible[random.randint(0, len(accessible)-1)] for i in range(4)]
+        self.prepare_layout(size, spawn, possible_ghost_spawn, big_dots)
 
-        possible_ghost_spawn = [accessible[random.randint(0, len(accessible) - 1)] for i in range(4)]
-        ghost_spawn = {
-            game.GhostNames.inky: possible_ghost_spawn[0],
-            game.GhostNames.pinky: possible_ghost_spawn[1],
-            game.GhostNames.blinky: possible_ghost_spawn[2],
-            game.GhostNames.clyde: possible_ghost_spawn[3]
-        }
+    @classmethod
+    def from_corpus(cls, corpus, index):
+        """Loads the layout stored under given index of a maze corpus, without generating it again"""
+        record = corpus.record(index)
+        layout = cls.__new__(cls)
+        layout.type = record.type
+        layout.seed = record.seed
+        layout.model = record.model
+        layout.prepare_layout(corpus.size, record.spawn, record.ghost_spawns, record.big_dots)
+        return layout
 
-        possible_spawn = [x for x in accessible if x not in possible_ghost_spawn]
-        spawn = possible_spawn[random.randint(0, len(possible_spawn) - 1)]
+    @staticmethod
+    def ghost_names():
+        # order in which ghosts spawns are listed
+        return [GhostNames.inky, GhostNames.pinky, GhostNames.blinky, GhostNames.clyde]
+
+    def prepare_layout(self, size, spawn, ghost_spawns, big_dots):
+        walls = [(i, j) for i in range(size[0]) for j in range(size[1]) if self.model[j][i] == 1]
+
+        ghost_house = []
+
+        ghost_path = []
+
+        accessible = [(i, j) for i in range(size[0]) for j in range(size[1]) if self.model[j][i] == 0]
+
+        ghost_spawn = dict(zip(GeneratedLayout.ghost_names(), ghost_spawns))
 
         tunnel = []
 
-        super().__init__(walls, accessible, ghost_spawn, ghost_house, ghost_path, spawn, tunnel, big_dots, self.SIZE)
+        super().__init__(walls, accessible, ghost_spawn, ghost_house, ghost_path, spawn, tunnel, big_dots, size)
@@ -0,0 +1,36 @@
+class TileBuckets(object):
+    """Characters grouped by the tiles they are on, so collisions are only checked between those on nearby tiles.
+
+    Characters close enough to collide (closer than a tile) are always on the same or adjacent tiles.
+    """
+
+    def __init__(self):
+        # tile -> characters on it, kept in dictionaries (ordered by their arrival) instead of sets
+        self.buckets = {}
+
+    def move(self, character, old_tile, new_tile):
+        if old_tile is not None:
+            bucket = self.buckets.get(old_tile)
+            if bucket is not None:
+                bucket.pop(character, None)
+                if not bucket:
+                    del self.buckets[old_tile]
+        if new_tile is not None:
+            self.buckets.setdefault(new_tile, {})[character] = None
+
+    def near(self, tile):
+        """Characters on given and adjacent tiles"""
+        x, y = tile
+        for i in (x - 1, x, x + 1):
+            for j in (y - 1, y, y + 1):
+                bucket = self.buckets.get((i, j))
+                if bucket:
+                    yield from bucket
+
+    def colliding(self, character, radius, kind=None):
+        """Characters (optionally only of given class) whose centers are within radius from given one's center"""
+        x, y = character.position
+        squared_radius = radius * radius
+        return [other for other in self.near(character.position_tile)
+                if other is not character and (kind is None or isinstance(other, kind)) and
+                (other.position[0] - x) ** 2 + (other.position[1] - y) ** 2 <= squared_radius]
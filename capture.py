@@ -0,0 +1,180 @@
+import os
+import queue
+import shlex
+import struct
+import subprocess
+import sys
+import threading
+import zlib
+
+import pygame
+
+# 24-bit surfaces with these masks keep their pixels as R, G, B bytes
+RGB_MASKS = (0x0000ff, 0x00ff00, 0xff0000, 0)
+
+
+def frame_rows(frame):
+    """Views of the rows of RGB pixels of a frame, without copying them"""
+    width, height = frame.get_size()
+    pitch = frame.get_pitch()
+    pixels = memoryview(frame.get_buffer())  # all the bytes, with padding at the ends of rows
+    return [pixels[row * pitch:row * pitch + width * 3] for row in range(height)]
+
+
+def frame_pixels(frame):
+    """View of all the RGB pixels of a frame, copied only if its rows are padded"""
+    if frame.get_pitch() == frame.get_width() * 3:
+        return memoryview(frame.get_view('1')).cast('B')
+    return b''.join(frame_rows(frame))
+
+
+class RawVideoOutput(object):
+    """Frames as a single stream of RGB pixels (3 bytes per pixel, row by row, frame after frame)"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'wb')
+
+    def write(self, frame):
+        self.file.write(frame_pixels(frame))
+
+    def close(self):
+        self.file.close()
+
+
+class ImageSequenceOutput(object):
+    """Every frame as a PNG file, its path is the pattern formatted with the number of the frame"""
+    PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+    COMPRESSION_LEVEL = 1  # fast, frames are mostly flat areas anyway
+
+    def __init__(self, pattern):
+        directory = os.path.dirname(pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.pattern = pattern
+        self.frames = 0
+
+    @staticmethod
+    def png_chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    def write(self, frame):
+        # compressed with zlib in a single call, which (unlike saving images with pygame) lets the game run meanwhile
+        rows = b'\x00' + b'\x00'.join(frame_rows(frame))  # every row starts with its filter type, none
+        compressed = zlib.compress(rows, ImageSequenceOutput.COMPRESSION_LEVEL)
+
+        header = struct.pack('>IIBBBBB', frame.get_width(), frame.get_height(), 8, 2, 0, 0, 0)  # 8-bit RGB
+        with open(self.pattern % self.frames, 'wb') as image_file:
+            image_file.write(ImageSequenceOutput.PNG_SIGNATURE)
+            image_file.write(ImageSequenceOutput.png_chunk(b'IHDR', header))
+            image_file.write(ImageSequenceOutput.png_chunk(b'IDAT', compressed))
+            image_file.write(ImageSequenceOutput.png_chunk(b'IEND', b''))
+        self.frames += 1
+
+    def close(self):
+        pass
+
+
+class EncoderPipeOutput(object):
+    """RGB pixels of frames written to the standard input of an encoder, e.g. ffmpeg reading rawvideo"""
+
+    def __init__(self, command):
+        self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame_pixels(frame))
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+def open_output(target, size, fps):
+    """Output for given target: '|command' pipes frames to the command ({width}, {height} and {fps} are replaced),
+    paths with a '%' pattern give PNG sequences, other paths give raw RGB streams"""
+    if target.startswith('|'):
+        return EncoderPipeOutput(target[1:].format(width=size[0], height=size[1], fps=fps))
+    if '%' in target:
+        return ImageSequenceOutput(target)
+    return RawVideoOutput(target)
+
+
+class CaptureError(Exception):
+    """Captured frames could not be written, e.g. the encoder exited or the disk is full"""
+
+
+class FrameCapture(object):
+    """Captures presented frames of a surface and writes them out on a background thread.
+
+    The screen is drawn over in the next frame, so the game copies every frame once: a single blit into one of
+    a few preallocated RGB frames. The writer thread passes views of their pixels straight to the output, only
+    with calls that release the interpreter lock (writing files, zlib), so it does not hold the game back.
+    When all the frames are waiting to be written, new ones are dropped instead of slowing the game down,
+    unless dropping is turned off (e.g. for headless replays, where every frame matters more than the speed).
+    """
+    BUFFERS = 8
+    WRITER_NICENESS = 10
+
+    def __init__(self, surface, output, drop_frames=True, buffers=BUFFERS):
+        self.surface = surface
+        self.output = output
+        self.drop_frames = drop_frames
+        self.captured = 0
+        self.dropped = 0
+        self.error = None  # raised by the writer thread, reported by the next captured frame (or by close)
+        self.error_reported = False
+
+        self.free_frames = queue.Queue()
+        for _ in range(buffers):
+            self.free_frames.put(pygame.Surface(surface.get_size(), 0, 24, RGB_MASKS))
+        self.frames = queue.Queue()  # captured frames in order, None closes the writer
+
+        self.writer = threading.Thread(target=self.write_frames, name='frame capture writer', daemon=True)
+        self.writer.start()
+
+    def capture_frame(self):
+        self.check_writer()
+        try:
+            frame = self.free_frames.get(block=not self.drop_frames)
+        except queue.Empty:
+            self.dropped += 1
+            return
+        frame.blit(self.surface, (0, 0))
+        self.frames.put(frame)
+        self.captured += 1
+
+    def check_writer(self):
+        if self.error is not None and not self.error_reported:
+            self.error_reported = True
+            raise CaptureError('captured frames could not be written: %s' % self.error) from self.error
+
+    def write_frames(self):
+        if sys.platform.startswith('linux'):
+            # on Linux threads have priorities of their own, the game goes first when they compete for the CPU
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), FrameCapture.WRITER_NICENESS)
+            except OSError:
+                pass  # e.g. not permitted in a container, frames are written at the normal priority then
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.error is None:
+                try:
+                    self.output.write(frame)
+                except Exception as error:
+                    self.error = error  # frames are not written anymore, they only go back to the free ones
+            self.free_frames.put(frame)
+
+    def close(self):
+        """Waits until all the captured frames are written, raises CaptureError if any of them could not be"""
+        self.frames.put(None)
+        self.writer.join()
+        try:
+            self.output.close()
+        except OSError as error:
+            if self.error is None:
+                self.error = error
+        self.check_writer()
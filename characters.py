@@ -2,7 +2,9 @@ import abc
 from enum import Enum
 
 import pygame
-from math import floor, sqrt
+from math import floor
+
+import assets
 
 
 class Directions(Enum):
@@ -22,6 +24,11 @@ class Directions(Enum):
         elif direction == Directions.DOWN:
             return Directions.UP
 
+    @staticmethod
+    def direction_bit(direction):
+        # bit representing the direction in neighbour masks of the board layout
+        return 1 << (direction.value - 1)
+
 
 class Character(pygame.sprite.DirtySprite):
     BASE_SPEED = 120
@@ -44,19 +51,20 @@ class Character(pygame.sprite.DirtySprite):
         self.speed = Character.BASE_SPEED
 
         # movement-related features
-        self.position_tile = None
+        self._position_tile = None
         self.position = None
+        self.previous_position = None  # before the last step, characters are drawn between these two
         self.direction = Directions.UP
         self.is_running = False
         self.is_killing = False
 
         # textures related attributes
-        self.texture = None
+        self.texture_path = None
         self.texture_size = None
         self.idle_length = 0
         self.run_length = 0
         self.kill_length = 0
-        self.idle_textures = None
+        self.idle_textures = None  # animation frames, by whether they are flipped
         self.run_textures = None
         self.kill_textures = None
 
@@ -66,7 +74,7 @@ class Character(pygame.sprite.DirtySprite):
         self.image = None
 
         # game mechanics related features
-        self.last_teleport_time = pygame.time.get_ticks()
+        self.last_teleport_time = self.board.get_ticks()
 
     def safe_to_change_direction(self):
         margin = self.board.tile_size / 15
@@ -90,21 +98,12 @@ class Character(pygame.sprite.DirtySprite):
         self.position = ((self.position_tile[0] + 0.5) * self.board.tile_size,
                          (self.position_tile[1] + 0.5) * self.board.tile_size)
 
-    def tile_accessible(self, next_tile):
-        regular_tile = next_tile in self.board.board_layout.accessible
-
-        ghost_house_tile = self.position_tile in self.board.board_layout.ghost_path and next_tile in self.board.board_layout.ghost_path
-
-        tunnel_tile = False
-        for (start, end) in self.board.board_layout.tunnels:
-            tunnel_tile = next_tile == start or next_tile == end
-
-        return regular_tile or tunnel_tile or ghost_house_tile
+    def direction_accessible(self, direction):
+        passable = self.board.board_layout.passable_directions(self.position_tile)
+        return passable & Directions.direction_bit(direction) != 0
 
     def change_direction(self, new_direction):
-        tile_switch = Character.DIRECTION_SWITCH_MAP.get(new_direction)
-        next_tile = self.position_tile[0] + tile_switch[0], self.position_tile[1] + tile_switch[1]
-        if self.tile_accessible(next_tile) and self.safe_to_change_direction():
+        if self.direction_accessible(new_direction) and self.safe_to_change_direction():
             self.is_running = True
             self.direction = new_direction
 
@@ -116,9 +115,7 @@ class Character(pygame.sprite.DirtySprite):
             self.is_running = True
 
         tile_switch = Character.DIRECTION_SWITCH_MAP.get(self.direction)
-        next_tile = self.position_tile[0] + tile_switch[0], self.position_tile[1] + tile_switch[1]
-
-        self.is_running = self.tile_accessible(next_tile) or self.safe_to_reach_center()
+        self.is_running = self.direction_accessible(self.direction) or self.safe_to_reach_center()
 
         if self.is_running:
             self.position = \
@@ -127,55 +124,88 @@ class Character(pygame.sprite.DirtySprite):
             self.position_tile = self.position[0] // self.board.tile_size, self.position[1] // self.board.tile_size
 
     def teleport_character(self, target_tile):
-        time = pygame.time.get_ticks()
+        time = self.board.get_ticks()
         if abs(time - self.last_teleport_time) > Character.TELEPORT_TIME_GAP:
             self.last_teleport_time = time
             self.position_tile = target_tile
             self.set_position_to_tile_center()
 
     def update(self, dt, *args):
-        self.dirty = 1  # it is always dirty
+        """Advances the character by a single game step"""
+        self.previous_position = self.position
+        self.move(dt)
         self.set_rect()
+
+    def prepare_frame(self, alpha):
+        """Sets image and area drawn in current frame, alpha is the part of a step passed since the last one"""
+        self.dirty = 1  # it is always dirty
         self.set_image()
-        self.move(dt)
+        self.set_rect(self.interpolated_position(alpha))
+
+    def interpolated_position(self, alpha):
+        # teleports and respawns are not smoothed
+        if self.previous_position is None or \
+                abs(self.position[0] - self.previous_position[0]) + \
+                abs(self.position[1] - self.previous_position[1]) > self.board.tile_size / 2:
+            return self.position
+        return (self.previous_position[0] + (self.position[0] - self.previous_position[0]) * alpha,
+                self.previous_position[1] + (self.position[1] - self.previous_position[1]) * alpha)
+
+    @abc.abstractmethod
+    def tile_rect(self, number_of_tile):
+        """Area of the tile in character's texture source"""
 
     @abc.abstractmethod
-    def load_tile(self, texture, number_of_tile):
-        """Loads the tile from given texture source"""
-
-    def load_tile_scaled(self, texture, tile_number):
-        """Loads the tile from given texture source, respecting character's width and height"""
-        return pygame.transform.scale(self.load_tile(texture, tile_number),
-                                      (self.character_width, self.character_height))
-
-    def set_rect(self):
-        """Sets up the area occupied by this character"""
-        self.rect = pygame.Rect(self.position[0] - self.character_width / 2,
-                                self.position[1] - self.character_height / 2,
+    def load_textures(self):
+        """Loads animation frames, characters of headless boards (never drawn) go without them"""
+
+    def load_frames(self, texture_path, tile_numbers):
+        """Loads the tiles scaled to character's size from the shared cache, both as they are and flipped"""
+        size = (self.character_width, self.character_height)
+        return {flipped: [assets.frame(texture_path, self.tile_rect(number), size, flipped) for number in tile_numbers]
+                for flipped in (False, True)}
+
+    def set_rect(self, position=None):
+        """Sets up the area occupied by this character (at its position, unless another is given)"""
+        position = position or self.position
+        self.rect = pygame.Rect(position[0] - self.character_width / 2,
+                                position[1] - self.character_height / 2,
                                 self.character_width,
                                 self.character_height)
 
     def set_image(self):
         """Method that sets 'image' field using character's textures"""
+        ticks = self.board.get_ticks()
+        flipped = self.direction in [Directions.LEFT, Directions.UP]
         if self.is_killing:
-            image_index = int(floor(pygame.time.get_ticks() * Character.TILES_CHANGE_SPEED) % self.kill_length)
-            self.image = self.kill_textures[image_index]
+            image_index = int(floor(ticks * Character.TILES_CHANGE_SPEED) % self.kill_length)
+            self.image = self.kill_textures[flipped][image_index]
         elif self.is_running:
-            image_index = int(floor(pygame.time.get_ticks() * Character.TILES_CHANGE_SPEED) % self.run_length)
-            self.image = self.run_textures[image_index]
+            image_index = int(floor(ticks * Character.TILES_CHANGE_SPEED) % self.run_length)
+            self.image = self.run_textures[flipped][image_index]
         else:
-            image_index = int(floor(pygame.time.get_ticks() * Character.TILES_CHANGE_SPEED) % self.idle_length)
-            self.image = self.idle_textures[image_index]
+            image_index = int(floor(ticks * Character.TILES_CHANGE_SPEED) % self.idle_length)
+            self.image = self.idle_textures[flipped][image_index]
 
-        if self.direction in [Directions.LEFT, Directions.UP]:
-            self.image = pygame.transform.flip(self.image, True, False)
+    @property
+    def position_tile(self):
+        return self._position_tile
 
-    def is_colliding(self, character):
-        return sqrt(pow(self.position[0] - character.position[0], 2) +
-                    pow(self.position[1] - character.position[1], 2)) <= self.board.tile_size / 2.0
+    @position_tile.setter
+    def position_tile(self, tile):
+        # characters are kept in the board's buckets of the tiles they are on
+        if tile != self._position_tile:
+            self.board.characters.move(self, self._position_tile, tile)
+            self._position_tile = tile
+
+    def colliding_characters(self, kind=None):
+        """Characters (optionally only of given class) colliding with this one, looked up on the nearby tiles"""
+        return self.board.characters.colliding(self, self.board.tile_size / 2.0, kind)
 
 
 class Pacman(Character):
+    TEXTURE_PATH = './sheets/Dwarf Sprite Sheet.png'
+    TEXTURE_SIZE = 32
     TEXTURES_ROW = TEXTURES_COLUMN = 10
     SPEED_BONUS = 20
 
@@ -189,25 +219,36 @@ class Pacman(Character):
         self.is_running = True
 
         # textures related attributes
-        self.texture = pygame.image.load('./sheets/Dwarf Sprite Sheet.png')
-        self.texture_size = 32
+        self.texture_path = Pacman.TEXTURE_PATH
+        self.texture_size = Pacman.TEXTURE_SIZE
         # self.character_height = self.character_width = 2 * self.board.tile_size
 
         self.idle_length = 5
         self.run_length = 8
         self.kill_length = 7
-        self.idle_textures = [self.load_tile_scaled(self.texture, i) for i in range(0, 5)]
-        self.run_textures = [self.load_tile_scaled(self.texture, i) for i in range(10, 18)]
-        self.kill_textures = [self.load_tile_scaled(self.texture, i) for i in range(20, 27)]
+        if board.game_screen is not None:  # headless boards are never drawn
+            self.load_textures()
         self.set_rect()
 
         # game mechanisms related attributes
         self.is_killing = False
 
-    def load_tile(self, texture, number_of_tile):
+    def load_textures(self):
+        self.idle_textures = self.load_frames(self.texture_path, range(0, 5))
+        self.run_textures = self.load_frames(self.texture_path, range(10, 18))
+        self.kill_textures = self.load_frames(self.texture_path, range(20, 27))
+
+    def respawn(self):
+        self.position_tile = self.board.board_layout.spawn
+        self.set_position_to_tile_center()
+        self.is_running = False
+        self.direction = Directions.UP
+        self.is_killing = False
+
+    @staticmethod
+    def tile_rect(number_of_tile):
         row = floor(number_of_tile / Pacman.TEXTURES_ROW)
         column = number_of_tile % Pacman.TEXTURES_COLUMN
-        crop_left_px = column * self.texture_size
-        crop_up_px = row * self.texture_size
-        return texture.subsurface(crop_left_px, crop_up_px,
-                                  self.texture_size, self.texture_size)
+        crop_left_px = column * Pacman.TEXTURE_SIZE
+        crop_up_px = row * Pacman.TEXTURE_SIZE
+        return crop_left_px, crop_up_px, Pacman.TEXTURE_SIZE, Pacman.TEXTURE_SIZE
@@ -1,55 +1,114 @@
 import pygame
 
 
-class Dot(pygame.sprite.DirtySprite):
-
-    def __init__(self, x_tile, y_tile, tile_size, *groups):
-        super().__init__(*groups)
-        self.tile = (x_tile, y_tile)
-        self.size = tile_size // 5
-
-        self.image = pygame.Surface((self.size, self.size))
-        self.image.fill((255, 255, 0))
-        self.rect = pygame.Rect((x_tile + 0.5) * tile_size - self.size / 2,
-                                (y_tile + 0.5) * tile_size - self.size / 2,
-                                self.size,
-                                self.size)
-        self.dirty = 1
-        self.refresh = 0  # specifies how many times to perform complete refresh (force dirty=1)
-
-    def update(self, alive_group, *args):
-        # refresh without calculating distances
-        if self.refresh > 0:
-            self.refresh -= 1
-            self.dirty = 1
-            return
+class DotField(object):
+    """Dots and big dots of a board, kept as a per-tile bitmap (in the board layout grid) instead of sprites"""
+    DOT = 1
+    BIG_DOT = 2
+    DOT_SIZE_DIVIDER = 5  # tile size divided by this gives the size of a dot
+    BIG_DOT_SIZE_DIVIDER = 2
+    COLOR = (255, 255, 0)
+
+    def __init__(self, board):
+        self.board = board
+        layout = board.board_layout
+
+        self.initial_dots = bytearray(len(layout.tile_grid))
+        for tile in layout.accessible:
+            self.initial_dots[layout.tile_index(tile)] |= DotField.DOT
+        for tile in layout.big_dots_indices:
+            self.initial_dots[layout.tile_index(tile)] |= DotField.BIG_DOT
+        self.initial_dots_left = sum(1 for dot in self.initial_dots if dot & DotField.DOT)
+        self.initial_big_dots_left = sum(1 for dot in self.initial_dots if dot & DotField.BIG_DOT)
+
+        self.dots = None
+        self.dots_left = 0
+        self.big_dots_left = 0
+
+        # dots eaten since the last reset, in order (as index << 2 | dot), e.g. for sending them over the network
+        self.eaten = []
+        self.resets = 0
+
+        # background with all the remaining dots drawn on it, only for boards drawn as a whole
+        self.layer = pygame.Surface(board.background.get_size()) if board.background is not None else None
+        self.reset()
+
+    def reset(self):
+        """Puts all the dots back on the board"""
+        self.dots = bytearray(self.initial_dots)
+        self.dots_left = self.initial_dots_left
+        self.big_dots_left = self.initial_big_dots_left
+        self.eaten = []
+        self.resets += 1
 
-        too_close = False
-        close_enough = False
+        if self.layer is not None:
+            self.layer.blit(self.board.background, (0, 0))
+            layout = self.board.board_layout
+            self.draw_tiles(self.layer, pygame.Rect((0, 0), layout.layout_size))
 
-        for sprite in alive_group.sprites():
-            dist_x = sprite.position_tile[0] - self.tile[0]
-            dist_y = sprite.position_tile[1] - self.tile[1]
-            dist = max(abs(dist_x), abs(dist_y))
+    def remaining(self):
+        return self.dots_left + self.big_dots_left
 
-            if dist < 4:
-                close_enough = True
+    def has_dot(self, tile):
+        index = self.board.board_layout.tile_index(tile)
+        return index is not None and self.dots[index] != 0
 
-            if dist < 1:
-                too_close = True
-                break
+    def dot_rect(self, tile, dot):
+        """Area occupied by the dot (or big dot) placed in the center of given tile"""
+        divider = DotField.DOT_SIZE_DIVIDER if dot == DotField.DOT else DotField.BIG_DOT_SIZE_DIVIDER
+        size = self.board.tile_size // divider
+        return pygame.Rect((tile[0] + 0.5) * self.board.tile_size - size / 2,
+                           (tile[1] + 0.5) * self.board.tile_size - size / 2,
+                           size,
+                           size)
+
+    def eat(self, rect, position_tile):
+        """Removes dots touched by given rectangle and returns numbers of eaten dots and big dots"""
+        eaten = {DotField.DOT: 0, DotField.BIG_DOT: 0}
+        layout = self.board.board_layout
+
+        # a character is one tile wide, so only dots on its own and adjacent tiles can be touched
+        x, y = int(position_tile[0]), int(position_tile[1])
+        for tile in [(x + i, y + j) for i in (-1, 0, 1) for j in (-1, 0, 1)]:
+            index = layout.tile_index(tile)
+            if index is None or not self.dots[index]:
+                continue
+
+            for dot in (DotField.DOT, DotField.BIG_DOT):
+                if self.dots[index] & dot and rect.colliderect(self.dot_rect(tile, dot)):
+                    self.remove(index, dot)
+                    eaten[dot] += 1
+
+        return eaten[DotField.DOT], eaten[DotField.BIG_DOT]
+
+    def remove(self, index, dot):
+        """Removes the dot (or big dot) from the tile under given index of the grid, if it is still there"""
+        if not self.dots[index] & dot:
+            return
+        self.dots[index] &= ~dot
+        self.eaten.append(index << 2 | dot)
+        if dot == DotField.DOT:
+            self.dots_left -= 1
+        else:
+            self.big_dots_left -= 1
 
-        if close_enough and not too_close:
-            self.dirty = 1
+        if self.layer is not None:
+            dot_rect = self.dot_rect(self.board.board_layout.grid_tile(index), dot)
+            self.layer.blit(self.board.background, dot_rect, dot_rect)
 
+    def eaten_rects(self, start=0):
+        """Areas of the dots eaten since given number of them, in the order they were eaten"""
+        layout = self.board.board_layout
+        return [self.dot_rect(layout.grid_tile(eaten >> 2), eaten & 3) for eaten in self.eaten[start:]]
 
-class BigDot(Dot):
-    def __init__(self, x_tile, y_tile, tile_size, *groups):
-        super().__init__(x_tile, y_tile, tile_size, *groups)
-        self.size = tile_size // 2
-        self.image = pygame.Surface((self.size, self.size))
-        self.image.fill((255, 255, 0))
-        self.rect = pygame.Rect((x_tile + 0.5) * tile_size - self.size / 2,
-                                (y_tile + 0.5) * tile_size - self.size / 2,
-                                self.size,
-                                self.size)
+    def draw_tiles(self, surface, tiles_rect, offset=(0, 0)):
+        """Draws dots lying in given rectangle of tiles, moved by offset (in px)"""
+        layout = self.board.board_layout
+        for i in range(tiles_rect.left, tiles_rect.right):
+            for j in range(tiles_rect.top, tiles_rect.bottom):
+                index = layout.tile_index((i, j))
+                if index is None or not self.dots[index]:
+                    continue
+                for dot in (DotField.DOT, DotField.BIG_DOT):
+                    if self.dots[index] & dot:
+                        surface.fill(DotField.COLOR, self.dot_rect((i, j), dot).move(offset))
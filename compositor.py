@@ -0,0 +1,46 @@
+import pygame
+
+
+class Compositor(object):
+    """Collects areas of the screen changed during a frame and presents them to the display at once"""
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.dirty_rects = []
+        self.full_refresh = False
+        self.capture = None  # gets every presented frame, when set
+
+    def add(self, rects):
+        self.dirty_rects.extend(rects)
+
+    def add_rect(self, rect):
+        self.dirty_rects.append(pygame.Rect(rect))
+
+    def refresh_all(self):
+        self.full_refresh = True
+
+    @staticmethod
+    def merge_rects(rects):
+        """Joins overlapping (or touching) rectangles, so every area is sent to the display only once"""
+        merged = []
+        for rect in rects:
+            rect = pygame.Rect(rect)
+            if rect.width <= 0 or rect.height <= 0:
+                continue
+            # a joined rectangle may reach others, so joining goes on until nothing more collides
+            colliding = rect.inflate(2, 2).collidelist(merged)
+            while colliding != -1:
+                rect.union_ip(merged.pop(colliding))
+                colliding = rect.inflate(2, 2).collidelist(merged)
+            merged.append(rect)
+        return merged
+
+    def present(self):
+        if self.full_refresh:
+            pygame.display.flip()
+        elif self.dirty_rects:
+            pygame.display.update(Compositor.merge_rects(self.dirty_rects))
+        self.dirty_rects = []
+        self.full_refresh = False
+        if self.capture is not None:
+            self.capture.capture_frame()
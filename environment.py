@@ -0,0 +1,238 @@
+import numpy as np
+
+import board
+import game
+from batch_simulation import BatchSimulation
+from characters import Directions
+from collectibles import DotField
+from simulation import Simulation
+
+
+class Observations(object):
+    """Observations of a batch of games, as NumPy grids of the board tiles (one byte per tile) stacked in channels.
+
+    Channels mark walls, dots, big dots, pacman and every ghost (in the BatchSimulation.GHOSTS order), the last one
+    counts vulnerable ghosts on every tile. Walls come from the board layout once, the other channels are only
+    updated on tiles where something changed: where characters left or entered, or where dots could be eaten.
+    """
+    WALLS = 0
+    DOTS = 1
+    BIG_DOTS = 2
+    PACMAN = 3  # followed by channels of the ghosts
+    VULNERABLE = PACMAN + BatchSimulation.ENTITIES
+    CHANNELS = VULNERABLE + 1
+
+    # pacman is one tile wide, so it only eats dots on its own and adjacent tiles
+    NEIGHBOURHOOD = np.array([(i, j) for i in (-1, 0, 1) for j in (-1, 0, 1)])
+
+    def __init__(self, layout, batch_size):
+        self.layout = layout
+        self.batch_size = batch_size
+        self.width, self.height = layout.layout_size
+        self.grids = np.zeros((batch_size, Observations.CHANNELS, self.height, self.width), dtype=np.uint8)
+
+        tile_grid = np.frombuffer(bytes(layout.tile_grid), dtype=np.uint8)
+        self.grids[:, Observations.WALLS] = self.layout_view(tile_grid) & board.BoardLayout.TILE_WALL != 0
+
+        # tiles and vulnerability of characters as they are marked in the grids, -1 for not marked yet
+        self.tiles = np.full((batch_size, BatchSimulation.ENTITIES, 2), -1, dtype=np.int64)
+        self.vulnerable = np.zeros((batch_size, len(BatchSimulation.GHOSTS)), dtype=bool)
+        self.channels = Observations.PACMAN + np.arange(BatchSimulation.ENTITIES)
+        self.games = np.arange(batch_size)
+
+    def layout_view(self, cells):
+        """View of cells of the padded board grid (the last axis) as grids of the layout tiles"""
+        padding = board.BoardLayout.GRID_PADDING
+        grid = cells.reshape(cells.shape[:-1] + (self.layout.grid_height, self.layout.grid_width))
+        return grid[..., padding:padding + self.height, padding:padding + self.width]
+
+    def inside(self, x, y):
+        return (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+
+    def mark(self, games, channels, tiles, value):
+        x, y = tiles[..., 0], tiles[..., 1]
+        inside = self.inside(x, y)
+        self.grids[games[inside], channels[inside], y[inside], x[inside]] = value
+
+    def count(self, games, tiles, change):
+        x, y = tiles[..., 0], tiles[..., 1]
+        inside = self.inside(x, y)
+        games = games[inside]
+        np.add.at(self.grids, (games, np.full_like(games, Observations.VULNERABLE), y[inside], x[inside]), change)
+
+    def reset_dots(self, games, dots, big_dots):
+        """Copies all the dots of selected games, given as cells of the padded board grid"""
+        self.grids[games, Observations.DOTS] = self.layout_view(dots[games])
+        self.grids[games, Observations.BIG_DOTS] = self.layout_view(big_dots[games])
+
+    def copy_dots_around(self, tiles, dots, big_dots):
+        """Copies dots (cells of the padded board grid) of every game lying around given tile (e.g. of pacman)"""
+        padding = board.BoardLayout.GRID_PADDING
+        cells = tiles.astype(np.int64)[:, None, :] + Observations.NEIGHBOURHOOD
+        x, y = cells[..., 0], cells[..., 1]
+        inside = self.inside(x, y)
+        games = np.broadcast_to(self.games[:, None], inside.shape)[inside]
+        x, y = x[inside], y[inside]
+        indices = (y + padding) * self.layout.grid_width + x + padding
+        self.grids[games, Observations.DOTS, y, x] = dots[games, indices]
+        self.grids[games, Observations.BIG_DOTS, y, x] = big_dots[games, indices]
+
+    def remove_dot(self, game_index, index, dot):
+        """Removes a dot (or a big dot) eaten on the tile under given index of the padded board grid"""
+        x, y = self.layout.grid_tile(index)
+        channel = Observations.DOTS if dot == DotField.DOT else Observations.BIG_DOTS
+        self.grids[game_index, channel, y, x] = 0
+
+    def move_character(self, game_index, entity, tile, vulnerable=False):
+        """Moves the mark of a single character to given tile, cheaper than update_characters for single games"""
+        grids = self.grids[game_index]
+        ghost_index = entity - 1
+        old_x, old_y = self.tiles[game_index, entity].tolist()
+        if self.inside(old_x, old_y):
+            grids[Observations.PACMAN + entity, old_y, old_x] = 0
+            if ghost_index >= 0 and self.vulnerable[game_index, ghost_index]:
+                grids[Observations.VULNERABLE, old_y, old_x] -= 1
+
+        x, y = int(tile[0]), int(tile[1])
+        if self.inside(x, y):
+            grids[Observations.PACMAN + entity, y, x] = 1
+            if vulnerable:
+                grids[Observations.VULNERABLE, y, x] += 1
+        self.tiles[game_index, entity] = x, y
+        if ghost_index >= 0:
+            self.vulnerable[game_index, ghost_index] = vulnerable
+
+    def update_characters(self, tiles, vulnerable):
+        """Moves marks of characters (pacman and then the ghosts) that changed their tiles or vulnerability"""
+        moved = (tiles != self.tiles).any(axis=-1)
+        changed = moved[:, 1:] | (vulnerable != self.vulnerable)
+        if changed.any():
+            games, ghosts = np.nonzero(changed & self.vulnerable)
+            self.count(games, self.tiles[games, 1 + ghosts], -1)
+            games, ghosts = np.nonzero(changed & vulnerable)
+            self.count(games, tiles[games, 1 + ghosts], 1)
+            self.vulnerable[:] = vulnerable
+
+        if moved.any():
+            games, entities = np.nonzero(moved)
+            channels = self.channels[entities]
+            self.mark(games, channels, self.tiles[games, entities], 0)
+            self.mark(games, channels, tiles[games, entities], 1)
+            self.tiles[games, entities] = tiles[games, entities]
+
+
+class Environment(object):
+    """Gym-style environment of a single headless game.
+
+    reset() starts a game and returns the first observation, step(action) returns (observation, reward, done, info).
+    Actions are values of Directions (0 keeps pacman going), rewards are points scored in the step. Observations
+    (channels, height, width) are one preallocated array updated in place, it has to be copied to be kept.
+    """
+    ACTIONS = [None] + list(Directions)
+
+    def __init__(self, layout, tile_size=game.TILE_SIZE, dt=Simulation.DEFAULT_DT, shortest_path_targeting=False):
+        self.simulation = Simulation(layout, tile_size, dt, shortest_path_targeting)
+        self.observations = Observations(layout, 1)
+        self.observation = self.observations.grids[0]
+
+        monsters = self.simulation.monsters
+        self.ghosts = [monsters.get(name) for name in BatchSimulation.GHOSTS]
+        self.characters = [self.simulation.player] + self.ghosts
+
+        self.dots_resets = None  # resets of the dot field seen by the observation
+        self.dots_eaten = 0
+        self.observed_characters = [None] * len(self.characters)  # tiles and vulnerability
+        self.points = 0
+
+    def reset(self):
+        self.simulation.reset()
+        self.points = 0
+        self.observe()
+        return self.observation
+
+    def step(self, action):
+        self.simulation.step(Environment.ACTIONS[action])
+        self.observe()
+
+        status = self.simulation.status
+        reward = status.player_points - self.points
+        self.points = status.player_points
+        info = {'lives': status.player_lives, 'level': status.level_number, 'frame': self.simulation.frame}
+        return self.observation, reward, self.simulation.game_over, info
+
+    def observe(self):
+        dots = self.simulation.dots
+        if dots.resets != self.dots_resets:
+            self.dots_resets = dots.resets
+            self.dots_eaten = 0
+            cells = np.frombuffer(bytes(dots.dots), dtype=np.uint8)[None]
+            self.observations.reset_dots(0, cells & DotField.DOT != 0, cells & DotField.BIG_DOT != 0)
+        for eaten in dots.eaten[self.dots_eaten:]:
+            self.observations.remove_dot(0, eaten >> 2, eaten & 3)
+        self.dots_eaten = len(dots.eaten)
+
+        # characters stay on their tiles for many steps, only those that changed anything are moved
+        for entity, character in enumerate(self.characters):
+            observed = character.position_tile, entity > 0 and not character.is_killing
+            if observed != self.observed_characters[entity]:
+                self.observed_characters[entity] = observed
+                self.observations.move_character(0, entity, *observed)
+
+
+class BatchEnvironment(object):
+    """Many games played at once on one board (with BatchSimulation), behind a vectorized gym-style interface.
+
+    Observations (games, channels, height, width), rewards and done flags of all the games are preallocated arrays
+    updated in place by every step. Finished games stay as they are until they are reset, selected games can be
+    reset at any time without touching the others.
+    """
+
+    def __init__(self, layout, batch_size, tile_size=game.TILE_SIZE, dt=Simulation.DEFAULT_DT):
+        self.simulation = BatchSimulation(layout, batch_size, tile_size, dt)
+        self.observations = Observations(layout, batch_size)
+        self.rewards = np.zeros(batch_size, dtype=np.int64)
+        self.dones = np.zeros(batch_size, dtype=bool)
+
+        self.tiles = np.zeros((batch_size, BatchSimulation.ENTITIES, 2), dtype=np.int64)
+        self.vulnerable = np.zeros((batch_size, len(BatchSimulation.GHOSTS)), dtype=bool)
+        self.points = np.zeros(batch_size, dtype=np.int64)
+        self.level_number = np.zeros(batch_size, dtype=np.int64)  # levels seen by the observations
+        self.reset()
+
+    def reset(self, games=None):
+        """Starts new games in place of the selected ones (a mask, all of them by default), returns observations"""
+        # copied, as the mask is usually the done flags returned by step, which are cleared here
+        games = np.ones(self.simulation.batch_size, dtype=bool) if games is None else np.array(games, dtype=bool)
+        self.simulation.reset(games)
+        self.points[games] = 0
+        self.dones[games] = False
+        self.reset_dots(games)
+        self.observe_characters()
+        return self.observations.grids
+
+    def step(self, actions):
+        """Advances every unfinished game by a frame; actions are values of Directions (0 keeps pacman going).
+        Returns observations, rewards and done flags of all the games."""
+        simulation = self.simulation
+        simulation.step(actions)
+
+        np.subtract(simulation.player_points, self.points, out=self.rewards)
+        self.points[:] = simulation.player_points
+        self.dones[:] = simulation.game_over
+
+        # dots are only eaten around pacman, and all of them come back when a level is finished
+        self.observations.copy_dots_around(simulation.tiles[:, 0], simulation.dots, simulation.big_dots)
+        next_level = simulation.level_number != self.level_number
+        if next_level.any():
+            self.reset_dots(next_level)
+        self.observe_characters()
+        return self.observations.grids, self.rewards, self.dones
+
+    def reset_dots(self, games):
+        self.level_number[games] = self.simulation.level_number[games]
+        self.observations.reset_dots(games, self.simulation.dots, self.simulation.big_dots)
+
+    def observe_characters(self):
+        self.tiles[:] = self.simulation.tiles
+        np.logical_not(self.simulation.ghosts_killing, out=self.vulnerable)
+        self.observations.update_characters(self.tiles, self.vulnerable)
@@ -1,11 +1,25 @@
+import argparse
 import os
-from time import sleep
+import random
+import struct
+import sys
+import zlib
+from time import perf_counter, sleep, strftime
+
+STARTED = perf_counter()  # startup is measured from here, so that imports of the game are included
 
 import pygameMenu
 from pygameMenu.locals import *
 
+import assets
 import board
 import characters
+import collectibles
+import compositor
+import hud
+import profiler
+import replay
+import viewport
 from ghosts import *
 
 TITLE = "Pacman WIEiT Edition"
@@ -14,6 +28,8 @@ ICON_TITLE = "Pacman SE"
 BOARD_SIZE = (28, 36)  # 28 x 36 tiles is the original size of board
 TILE_SIZE = 25  # pixels
 SCREEN_RESOLUTION = (TILE_SIZE * BOARD_SIZE[0], TILE_SIZE * BOARD_SIZE[1])
+BOARD_AREA_SIZE = (TILE_SIZE * 28, TILE_SIZE * 31)  # part of the screen above the information panel
+LARGE_BOARD_SIZE = (99, 99)  # size of generated mazes in large board mode (in tiles)
 
 MENU_BACKGROUND_COLOR = (255, 255, 26)
 COLOR_GREY = (107, 102, 97)
@@ -21,6 +37,7 @@ COLOR_BLACK = (0, 0, 0)
 COLOR_SELECTED = (255, 153, 0)
 
 game = None
+shortest_path_targeting = False  # of ghosts in games chosen in the menu, set with --shortest-path-targeting
 
 
 class GameStatus(object):
@@ -31,20 +48,22 @@ class GameStatus(object):
     KILLING_DURATION = 5
     KILLING_BONUS_DURATION = 2
 
-    def __init__(self):
+    def __init__(self, get_ticks=pygame.time.get_ticks):
+        self.get_ticks = get_ticks  # time source (in ms), replaced by the headless simulation
         self.level_number = 1
         self.player_points = 0
         self.player_lives = GameStatus.MAX_LIVES
         self.killing_activated_time = None
         self.last_kill_time = None
         self.bonus_multiplier = 0
+        self.show_menus = True  # not when the game is replayed
 
     def add_dot_points(self, dots_no, big_dots_no=0):
         self.player_points += (dots_no * GameStatus.DOT_POINTS) + (big_dots_no * GameStatus.BIG_DOT_POINTS)
 
     def add_ghost_kill_points(self, no_ghosts_killed):
         while no_ghosts_killed > 0:
-            time = pygame.time.get_ticks()
+            time = self.get_ticks()
 
             if self.last_kill_time is not None and \
                     abs(time - self.last_kill_time) / 1000 < GameStatus.KILLING_BONUS_DURATION:
@@ -61,15 +80,20 @@ class GameStatus(object):
 
     def game_over(self):
         # when player has no lives left
-        game_over_menu.enable()
+        if self.show_menus:
+            game_over_menu.enable()
 
     def level_finished(self):
         # when all the dots are eaten
+        self.next_level()
+        if self.show_menus:
+            level_completed_menu.enable()
+
+    def next_level(self):
         self.level_number += 1
         self.killing_activated_time = None
         self.last_kill_time = None
         self.bonus_multiplier = 0
-        level_completed_menu.enable()
 
     def reset(self):
         self.level_number = 1
@@ -80,40 +104,184 @@ class GameStatus(object):
         self.bonus_multiplier = 0
 
 
-class Game(object):
-    FPS_LIMIT = 90
+class GameRules(object):
+    """Rules of the game, shared by the shown Game and the headless Simulation.
+
+    Subclasses have player, monsters, dots, status and get_ticks, and decide what happens when the game is over
+    (end_game) or all the dots are eaten (finish_level).
+    """
+
+    def play_step(self, dt, direction=None):
+        """Moves the characters by a single step and applies the rules, pacman optionally tries to turn"""
+        self.update_pacman_direction(direction)
+        self.update_characters(dt)
+        self.check_or_deactivate_pacman_killing()
+        if self.update_collisions():  # dots are not eaten on the step pacman is killed
+            self.update_dots()
+
+    def update_pacman_direction(self, direction):
+        if direction is not None:
+            self.player.change_direction(direction)
+
+    def update_characters(self, dt):
+        # pacman moves first, ghosts choose their directions knowing where it is
+        self.player.update(dt)
+        Ghost.ai_tick(self.monsters.values(), self.player, self.monsters.get(GhostNames.blinky))
+        for ghost in self.monsters.values():
+            ghost.update(dt)
+
+    def update_collisions(self):
+        # returns False when pacman has been killed
+        ghosts_colliding = self.player.colliding_characters(Ghost)
+        if not ghosts_colliding:
+            return True
+
+        if self.player.is_killing:
+            self.status.add_ghost_kill_points(len(ghosts_colliding))
+            for ghost in ghosts_colliding:
+                ghost.respawn()
+            return True
+
+        self.kill_pacman()
+        return False
+
+    def update_dots(self):
+        # eaten dots are erased from the dots layer right away
+        dots_no, big_dots_no = self.dots.eat(self.player.rect, self.player.position_tile)
+
+        if dots_no > 0 or big_dots_no > 0:
+            self.status.add_dot_points(dots_no, big_dots_no)
+            self.dots_eaten += dots_no + big_dots_no
+        if big_dots_no > 0:
+            self.activate_pacman_killing()
+
+        if not self.dots.remaining():
+            self.finish_level()
+
+    def kill_pacman(self):
+        self.status.player_lives -= 1
+        if self.status.player_lives == 0:
+            self.end_game()
+        else:
+            self.restart_characters_positions()
+
+    def end_game(self):
+        """Called when pacman has no lives left"""
+
+    def finish_level(self):
+        """Called when all the dots are eaten, the next level starts right away"""
+        self.status.next_level()
+        self.advance_to_next_level()
+
+    def restart_characters_positions(self):
+        self.player.respawn()
+        self.player.set_rect()
+        for ghost in self.monsters.values():
+            ghost.respawn()
+            ghost.is_killing = True
+
+    def activate_pacman_killing(self):
+        for monster in self.monsters.values():
+            monster.is_killing = False
+            monster.reverse_direction()
+
+        self.player.is_killing = True
+        self.player.speed += Pacman.SPEED_BONUS
+        self.status.killing_activated_time = self.get_ticks()
+
+    def check_or_deactivate_pacman_killing(self):
+        if self.player.is_killing and self.status.killing_activated_time is not None and \
+                (self.get_ticks() - self.status.killing_activated_time) / 1000 > GameStatus.KILLING_DURATION:
+            self.player.is_killing = False
+            self.player.speed -= Pacman.SPEED_BONUS
+            for monster in self.monsters.values():
+                monster.is_killing = True
+
+    def advance_to_next_level(self):
+        # start a new level, optionally: modify the difficulty
+        self.player.speed = Character.BASE_SPEED
+        self.restart_characters_positions()
+        self.dots.reset()
+
+
+class Game(GameRules):
+    FPS_LIMIT = 90  # of rendering only, 0 for no limit
+    STEP_DT = 1.0 / 90  # the game is always simulated in steps of this length (in s), whatever the frame rate
+    MAX_FRAME_TIME = 0.25  # longer frames are simulated as if they took that long, so the game never falls behind
     TICKS_PER_SEC = 1000.0
+    PROFILED_PHASES = ['events', 'wait', 'direction', 'ghosts ai', 'sprites update', 'sprites draw', 'collisions',
+                       'dots', 'panel', 'present']
+    PROFILER_OVERLAY_FRAMES = 30  # the overlay is rendered again after that many frames
+    PROFILES_PATH = './profiles/frames_%s'
+    REPLAYS_PATH = './replays/replay_%s.pmr'
+    CAPTURES_PATH = './captures/capture_%s_%dx%d.rgb'
+
+    def __init__(self, game_screen, game_clock, tile_size, layout='classic', shortest_path_targeting=False,
+                 layout_size=None):
+        assets.wait_for_preload()  # assets being loaded in the background are not loaded again
 
-    def __init__(self, game_screen, game_clock, tile_size, layout='classic'):
         self.finished = False
         self.game_screen = game_screen
         self.game_clock = game_clock
-        if layout == 'classic':
-            self.board = board.Board(tile_size, game_screen, board.ClassicLayout())
+        if isinstance(layout, board.BoardLayout):
+            board_layout = layout  # prepared by the caller, e.g. a seeded maze
+        elif layout == 'classic':
+            board_layout = board.ClassicLayout()
         else:
-            self.board = board.Board(tile_size, game_screen, board.GeneratedLayout(layout))
-
-        self.status = GameStatus()
+            import maze_corpus  # only needed for generated mazes, it is imported when the first one is played
+
+            # mazes are taken from a pre-generated corpus when there is one
+            layout_size = layout_size or board.GeneratedLayout.SIZE
+            # generated ones get seeds, so that they can be generated again when the game is replayed
+            board_layout = maze_corpus.random_layout(layout, layout_size) or \
+                board.GeneratedLayout(layout, layout_size, seed=random.randrange(2 ** 32))
+        self.board = board.Board(tile_size, game_screen, board_layout, shortest_path_targeting)
+
+        # simulated time (in ms), it only advances with game steps, so it stops during pauses
+        self.ticks = 0.0
+        self.accumulator = 0.0  # time (in s) not simulated yet
+        self.board.get_ticks = self.get_ticks
+
+        # boards larger than the screen are seen through a viewport following pacman
+        self.viewport = None
+        self.chunked_background = None
+        self.board_area = game_screen.subsurface(pygame.Rect((0, 0), BOARD_AREA_SIZE))
+        if self.board.background is None:
+            self.viewport = viewport.Viewport(BOARD_AREA_SIZE, self.board)
+            self.chunked_background = viewport.ChunkedBackground(self.board)
+
+        self.status = GameStatus(self.get_ticks)
+
+        # frames and inputs of the player are recorded, so the game can be replayed (saved with F5)
+        self.input_direction = None  # chosen for the current frame
+        self.recorder = replay.ReplayRecorder(board_layout, tile_size, shortest_path_targeting) \
+            if replay.ReplayRecorder.recordable(board_layout) else None
+
+        # everything drawn during a frame is shown at its end
+        self.compositor = compositor.Compositor(game_screen)
+
+        # times of frame phases, shown in an overlay (F3) and exported (F4)
+        self.profiler = profiler.FrameProfiler(Game.PROFILED_PHASES, Game.STEP_DT, idle_phases=['wait'])
+        self.profiler_overlay = None
+        self.profiler_overlay_shown = False
+        self.profiler_font = None  # looking up system fonts takes time, it is done when the overlay is shown
+        self.capture_error = None  # the last error that stopped capturing frames
 
         # pause properties
         self.pause = False
         self.first_after_pause = True
-        self.last_dt = 0
-        self.pause_start_ticks = 0
-        self.pause_end_ticks = 0
 
         # information panel properties
         self.font = pygame.font.Font('freesansbold.ttf', 20)
-        self.life_texture = pygame.image.load('./sheets/life.png')
-        self.life_size = 40
-        self.life_texture = pygame.transform.scale(self.life_texture, (self.life_size, self.life_size))
+        self.hud = hud.Hud(game_screen, self.font, GameStatus.MAX_LIVES)
         self.special_communique = ''
         self.is_special_communique_set = False
 
         self.ghosts_group = pygame.sprite.LayeredDirty()
         self.alive_group = pygame.sprite.LayeredDirty()
-        self.dots_group = self.board.prepare_dots()
-        self.big_dots_group = self.board.prepare_big_dots()
+        self.dots = collectibles.DotField(self.board)
+        self.dots_eaten = 0
+        self.dots_shown = (self.dots.resets, 0)  # eaten dots already erased on the screen, since the last reset
 
         self.player = characters.Pacman(self.board, self.alive_group)
         self.monsters = {
@@ -125,196 +293,327 @@ class Game(object):
 
     # game loop
     def main_loop(self):
-        self.alive_group.clear(self.game_screen, self.board.background)
-        self.dots_group.clear(self.game_screen, self.board.background)
+        if self.viewport is None:
+            # dots are a part of the background restored under moving characters
+            self.alive_group.clear(self.game_screen, self.dots.layer)
         while not self.finished:
-            self.events_loop()
+            self.profiler.start_frame()
+            with self.profiler.phase('events'):
+                self.events_loop()
             if not self.pause:
-                dt = self.game_clock.tick(Game.FPS_LIMIT) / Game.TICKS_PER_SEC
-                if self.first_after_pause:
-                    dt = self.last_dt
+                with self.profiler.phase('wait'):
+                    frame_time = min(self.game_clock.tick(Game.FPS_LIMIT) / Game.TICKS_PER_SEC, Game.MAX_FRAME_TIME)
+                resumed = self.first_after_pause
+                if resumed:
+                    frame_time = 0.0  # time spent in menus is not simulated
                     self.first_after_pause = False
-                    self.refresh_game_screen()
-                self.last_dt = dt
-                self.update_pacman_direction()
-                self.update_sprites(dt)
-                self.update_dots()
-                self.update_information_panel()
+
+                self.input_direction = self.read_direction()
+                if self.recorder is not None:
+                    self.recorder.record_frame(frame_time, self.input_direction, resumed)
+                self.simulate_frame(frame_time, resumed)
+                if self.recorder is not None and self.recorder.checksum_due():
+                    self.recorder.record_checksum(self.state_checksum())
+
+                self.draw_frame()
+            else:
+                self.profiler.cancel_frame()
+
+    def play_replay(self, recorded, realtime=True):
+        """Plays a recorded game, in real time or as fast as possible.
+
+        Returns the number of played frames and the first one after which the state differed from the recorded one
+        (None if it never did).
+        """
+        self.recorder = None
+        self.status.show_menus = False
+        if self.viewport is None:
+            self.alive_group.clear(self.game_screen, self.dots.layer)
+
+        frames = 0
+        for kind, value in recorded.records():
+            if kind == replay.Replay.FRAME:
+                frame_time, self.input_direction, resumed = value
+                self.profiler.start_frame()
+                with self.profiler.phase('events'):
+                    if pygame.event.peek(pygame.QUIT):
+                        break
+                    pygame.event.pump()
+                if realtime and frame_time > 0:
+                    with self.profiler.phase('wait'):
+                        self.game_clock.tick(1.0 / frame_time)
+
+                self.simulate_frame(frame_time, resumed)
+                frames += 1
+                self.is_special_communique_set = False  # recorded frames already include the countdown
+                self.draw_frame()
+            elif kind == replay.Replay.CHECKSUM:
+                if value != self.state_checksum():
+                    return frames, frames
+            elif kind == replay.Replay.NEW_GAME:
+                self.start_new_game()
+            elif kind == replay.Replay.NEXT_LEVEL:
+                self.start_next_level()
+        return frames, None
+
+    def simulate_frame(self, frame_time, resumed):
+        if resumed:
+            self.accumulator = 0.0
+            self.refresh_game_screen()
+
+        # as many fixed steps as fit in the time that has passed, the rest is left for next frames
+        self.accumulator += frame_time
+        while self.accumulator >= Game.STEP_DT and not self.pause:
+            self.step()
+            self.accumulator -= Game.STEP_DT
+
+    def draw_frame(self):
+        # characters are drawn between their last two positions, by the part of a step left over
+        self.draw_sprites(min(1.0, self.accumulator / Game.STEP_DT))
+        with self.profiler.phase('panel'):
+            self.update_information_panel()
+        with self.profiler.phase('present'):
+            self.draw_profiler_overlay()
+            self.present_frame()
+        self.profiler.end_frame()
+
+    def present_frame(self):
+        if self.compositor.capture is None:
+            self.compositor.present()
+            return
+
+        import capture  # imported when the capture was started
+        try:
+            self.compositor.present()
+        except capture.CaptureError as error:
+            self.report_capture_error(error)
+            self.end_capture()
 
     # maintaining events like mouse/button clicks etc
-    @staticmethod
-    def events_loop():
+    def events_loop(self):
         events = pygame.event.get()
         for event in events:
             if event.type == pygame.QUIT:
+                self.save_replay()
+                self.end_capture()
                 exit()
             if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                 pause_game()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.toggle_profiler_overlay()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                self.export_profile()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F5:
+                self.save_replay()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F6:
+                self.toggle_capture()
         pause_menu.mainloop(events)
         game_over_menu.mainloop(events)
         level_completed_menu.mainloop(events)
 
     def refresh_game_screen(self):
-        self.game_screen.blit(self.board.background, (0, 0))
-        for dot in self.dots_group:
-            dot.dirty = 1
-        for big_dot in self.big_dots_group:
-            big_dot.dirty = 1
-
-    # updating and drawing every alive character and collectibles
-    def update_sprites(self, dt):
-        # update alive characters (display)
-        self.alive_group.update(dt, self.player, self.monsters.get(GhostNames.blinky))
-        dirty_rectangles = self.alive_group.draw(self.game_screen)
-        pygame.display.update(dirty_rectangles)
-
-        # check for pacman killing status
-        self.check_or_deactivate_pacman_killing()
-
-        # check if pacman or ghosts are being eaten
-        ghosts_colliding = pygame.sprite.spritecollide(self.player, self.ghosts_group, dokill=False)
-        if len(ghosts_colliding) > 0:
-            if self.player.is_killing:
-                self.kill_ghosts(ghosts_colliding)
-            else:
-                for ghost in ghosts_colliding:
-                    if self.player.is_colliding(ghost):
-                        self.kill_pacman()
-                        return
+        self.compositor.refresh_all()
+        self.hud.invalidate()  # menus are drawn over the information panel too
+        if self.viewport is not None:
+            return  # visible part of a large board is redrawn every frame anyway
+
+        self.game_screen.blit(self.dots.layer, (0, 0))
+
+    def get_ticks(self):
+        return int(self.ticks)
+
+    def step(self):
+        """Advances the game by a single fixed time step"""
+        self.ticks += Game.STEP_DT * Game.TICKS_PER_SEC
+        self.play_step(Game.STEP_DT, self.input_direction)
+
+    # the rules with phases of the profiler
+    def update_pacman_direction(self, direction):
+        with self.profiler.phase('direction'):
+            super().update_pacman_direction(direction)
+
+    def update_characters(self, dt):
+        with self.profiler.phase('sprites update'):
+            self.player.update(dt)
+        with self.profiler.phase('ghosts ai'):
+            Ghost.ai_tick(self.monsters.values(), self.player, self.monsters.get(GhostNames.blinky))
+        with self.profiler.phase('sprites update'):
+            self.ghosts_group.update(dt)
+
+    def update_collisions(self):
+        with self.profiler.phase('collisions'):
+            return super().update_collisions()
 
     def update_dots(self):
-        # check for eaten small dots
-        dots_eaten = pygame.sprite.spritecollide(self.player, self.dots_group, dokill=True)
-        dots_no = len(dots_eaten)
-
-        # check for eaten big dots
-        big_dots_eaten = pygame.sprite.spritecollide(self.player, self.big_dots_group, dokill=True)
-        big_dots_no = len(big_dots_eaten)
-
-        if dots_no > 0 or big_dots_no > 0:
-            self.status.add_dot_points(dots_no, big_dots_no)
-        if big_dots_no > 0:
-            self.activate_pacman_killing()
-
-        # check if there are any dots left (whether level is unfinished)
-        if not (self.dots_group or self.big_dots_group):
-            self.pause = True
-            self.advance_to_next_level()
-            self.status.level_finished()
+        with self.profiler.phase('dots'):
+            super().update_dots()
 
-        self.draw_dots()
+    def draw_sprites(self, alpha):
+        for sprite in self.alive_group:
+            sprite.prepare_frame(alpha)
 
-    def draw_dots(self):
-        # update eaten dots (display)
-        self.dots_group.update(self.alive_group)
-        dirty_rectangles = self.dots_group.draw(self.game_screen)
-        pygame.display.update(dirty_rectangles)
-
-        self.big_dots_group.update(self.alive_group)
-        dirty_rectangles = self.big_dots_group.draw(self.game_screen)
-        pygame.display.update(dirty_rectangles)
-
-    def update_pacman_direction(self):
+        if self.viewport is not None:
+            self.draw_viewport()
+        else:
+            with self.profiler.phase('sprites draw'):
+                self.erase_eaten_dots()
+                self.compositor.add(self.alive_group.draw(self.game_screen))
+
+    def erase_eaten_dots(self):
+        # dots are eaten at simulated positions, the sprites are drawn behind them and do not clear the whole dots
+        resets, shown = self.dots_shown
+        if resets != self.dots.resets:
+            shown = 0  # the whole dots layer is put on the screen after a reset
+        for rect in self.dots.eaten_rects(shown):
+            self.compositor.add_rect(self.game_screen.blit(self.dots.layer, rect, rect))
+        self.dots_shown = (self.dots.resets, len(self.dots.eaten))
+
+    def draw_viewport(self):
+        # the whole visible part of a large board is redrawn, as it scrolls along with pacman
+        self.viewport.follow(self.player.rect.center)
+        self.chunked_background.draw(self.board_area, self.viewport)
+        offset = self.viewport.offset()
+
+        self.dots.draw_tiles(self.board_area, self.viewport.visible_tiles(margin=1), offset)
+
+        for sprite in self.alive_group:
+            if self.viewport.rect.colliderect(sprite.rect):
+                self.board_area.blit(sprite.image, sprite.rect.move(offset))
+
+        self.compositor.add_rect(self.board_area.get_rect())
+
+    def toggle_profiler_overlay(self):
+        self.profiler_overlay_shown = not self.profiler_overlay_shown
+        self.profiler_overlay = None
+        if not self.profiler_overlay_shown:
+            self.refresh_game_screen()  # removes the overlay
+
+    def draw_profiler_overlay(self):
+        if not self.profiler_overlay_shown:
+            return
+        if self.profiler_font is None:
+            self.profiler_font = pygame.font.SysFont('monospace', 14)
+        if self.profiler_overlay is None or self.profiler.frames % Game.PROFILER_OVERLAY_FRAMES == 0:
+            self.profiler_overlay = self.profiler.render_overlay(self.profiler_font)
+        self.compositor.add_rect(self.game_screen.blit(self.profiler_overlay, (5, 5)))
+
+    def export_profile(self):
+        path = Game.PROFILES_PATH % strftime('%Y%m%d-%H%M%S')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.profiler.export_csv(path + '.csv')
+        self.profiler.export_json(path + '.json')
+        self.profiler.export_chrome_trace(path + '.trace.json')
+
+    def toggle_capture(self):
+        # presented frames are saved as raw RGB, the size is a part of the file name
+        if self.compositor.capture is None:
+            path = Game.CAPTURES_PATH % ((strftime('%Y%m%d-%H%M%S'),) + self.game_screen.get_size())
+            try:
+                self.start_capture(path)
+            except OSError as error:
+                self.report_capture_error(error)
+        else:
+            self.end_capture()
+
+    def start_capture(self, target, drop_frames=True):
+        import capture  # frames are rarely captured, it is not imported at startup
+
+        # frames are captured as they are rendered, at the rate of the steps when it is not limited
+        fps = Game.FPS_LIMIT or round(1.0 / Game.STEP_DT)
+        output = capture.open_output(target, self.game_screen.get_size(), fps)
+        self.compositor.capture = capture.FrameCapture(self.game_screen, output, drop_frames)
+
+    def stop_capture(self):
+        """Stops capturing and returns the finished capture, raises CaptureError if frames could not be written"""
+        frame_capture = self.compositor.capture
+        if frame_capture is not None:
+            self.compositor.capture = None
+            frame_capture.close()
+        return frame_capture
+
+    def end_capture(self):
+        # captures started in the game end without ending the game, when frames could not be written
+        if self.compositor.capture is None:
+            return
+
+        import capture
+        try:
+            self.stop_capture()
+        except capture.CaptureError as error:
+            self.report_capture_error(error)
+
+    def report_capture_error(self, error):
+        self.capture_error = error
+        sys.stderr.write('capturing stopped: %s\n' % error)
+
+    def save_replay(self):
+        if self.recorder is not None:
+            self.recorder.save(Game.REPLAYS_PATH % strftime('%Y%m%d-%H%M%S'))
+
+    def state_checksum(self):
+        """Checksum of the state of characters and of the game status, compared when the game is replayed"""
+        state = [self.ticks, self.dots.dots_left, self.dots.big_dots_left, self.status.level_number,
+                 self.status.player_points, self.status.player_lives, self.status.bonus_multiplier,
+                 -1 if self.status.killing_activated_time is None else self.status.killing_activated_time,
+                 -1 if self.status.last_kill_time is None else self.status.last_kill_time]
+        for character in [self.player] + list(self.monsters.values()):
+            state += [character.position[0], character.position[1], character.direction.value, character.speed,
+                      character.is_killing]
+        return zlib.crc32(struct.pack('<%dd' % len(state), *state))
+
+    def read_direction(self):
+        """Direction chosen with the arrow keys, None if none of them is pressed"""
         keys_pressed = pygame.key.get_pressed()
         if keys_pressed[pygame.K_RIGHT]:
-            self.player.change_direction(Directions.RIGHT)
+            return Directions.RIGHT
         elif keys_pressed[pygame.K_LEFT]:
-            self.player.change_direction(Directions.LEFT)
+            return Directions.LEFT
         elif keys_pressed[pygame.K_UP]:
-            self.player.change_direction(Directions.UP)
+            return Directions.UP
         elif keys_pressed[pygame.K_DOWN]:
-            self.player.change_direction(Directions.DOWN)
-
-    def restart_characters_positions(self):
-        # restart pacman
-        self.player.position_tile = self.board.board_layout.spawn
-        self.player.set_position_to_tile_center()
-        self.player.is_running = False
-        self.player.direction = Directions.UP
-        self.player.is_killing = False
-
-        # restart ghosts
-        for colour, ghost in self.monsters.items():
-            ghost.position_tile = self.board.board_layout.ghost_spawns.get(colour)
-            ghost.set_position_to_tile_center()
-            ghost.direction = Directions.UP
-            ghost.is_killing = True
-
-        # refresh dots (draw)
-        for dot in self.dots_group.sprites():
-            dot.refresh = 2
+            return Directions.DOWN
+        return None
 
     # pacman and ghosts collisions handling
     def kill_pacman(self):
         # handler for event when pacman is eaten by a ghost
-        self.status.player_lives -= 1
-        if self.status.player_lives == 0:
-            self.pause = True
-            self.status.game_over()
-        else:
-            self.restart_characters_positions()
+        super().kill_pacman()
+        if self.status.player_lives > 0:
             self.special_communique = 'You have been killed. Continue in '
             self.is_special_communique_set = True
 
-    def kill_ghosts(self, ghosts_colliding):
-        # handler for event when ghosts are eaten by pacman
-        for ghost in ghosts_colliding:
-            if not self.player.is_colliding(ghost):
-                ghosts_colliding.remove(ghost)
-
-        self.status.add_ghost_kill_points(len(ghosts_colliding))
-
-        # return ghost to a spawn
-        for killed_ghost in ghosts_colliding:
-            for colour, ghost in self.monsters.items():
-                if ghost == killed_ghost:
-                    ghost.position_tile = self.board.board_layout.ghost_spawns.get(colour)
-                    ghost.set_position_to_tile_center()
-                    ghost.direction = Directions.UP
+    def end_game(self):
+        self.pause = True
+        self.status.game_over()
 
-    def activate_pacman_killing(self):
-        for monster in self.monsters.values():
-            monster.is_killing = False
-            monster.reverse_direction()
+    def finish_level(self):
+        # the next level starts when it is chosen in the menu
+        self.pause = True
+        self.advance_to_next_level()
+        self.status.level_finished()
 
-        self.player.is_killing = True
-        self.player.speed += Pacman.SPEED_BONUS
-        self.status.killing_activated_time = pygame.time.get_ticks()
-        self.pause_start_ticks = 0
-        self.pause_end_ticks = 0
+    def start_new_game(self):
+        if self.recorder is not None:
+            self.recorder.record_control(replay.ReplayRecorder.NEW_GAME)
+        self.advance_to_next_level()
+        self.pause = False
+        self.first_after_pause = True
+        self.status.reset()
 
-    def check_or_deactivate_pacman_killing(self):
-        if self.player.is_killing:
-            current_time = pygame.time.get_ticks()
-            if self.status.killing_activated_time is not None and \
-                    abs(current_time - self.pause_end_ticks + self.pause_start_ticks -
-                        self.status.killing_activated_time) / 1000 > GameStatus.KILLING_DURATION:
-                self.player.is_killing = False
-                self.player.speed -= Pacman.SPEED_BONUS
-                for monster in self.monsters.values():
-                    monster.is_killing = True
-
-    # next level loading
-    def advance_to_next_level(self):
-        # start a new level, optionally: modify the difficulty
-        self.player.speed = Character.BASE_SPEED
-        self.restart_characters_positions()
-        self.dots_group = self.board.prepare_dots()
-        self.big_dots_group = self.board.prepare_big_dots()
+    def start_next_level(self):
+        if self.recorder is not None:
+            self.recorder.record_control(replay.ReplayRecorder.NEXT_LEVEL)
+        self.advance_to_next_level()
+        self.pause = False
+        self.first_after_pause = True
 
     def update_information_panel(self):
-        points = self.font.render('SCORE:   ' + str(self.status.player_points), True, (255, 255, 255), None)
-        level = self.font.render('LEVEL:   ' + str(self.status.level_number), True, (255, 255, 255), None)
-        self.game_screen.fill(COLOR_BLACK, (0, 776, 700, 125))
-        self.game_screen.blit(points, (0, 786))
-        self.game_screen.blit(level, (0, 816))
-        for i in range(0, self.status.player_lives):
-            self.game_screen.blit(self.life_texture, (700 - self.life_size - (i * self.life_size), 776))
+        killing_time = None
         if self.player.is_killing:
-            ticks = pygame.time.get_ticks()
-            killing_time = 5.0 - (ticks - self.status.killing_activated_time) / 1000.0
-            time = self.font.render("KILLING TIME LEFT: %.2f s" % killing_time, True, (255, 255, 255), None)
-            self.game_screen.blit(time, (0, 846))
+            killing_time = 5.0 - (self.get_ticks() - self.status.killing_activated_time) / 1000.0
+        self.compositor.add(self.hud.update(self.status.player_points, self.status.level_number,
+                                            self.status.player_lives, killing_time))
+
         if self.is_special_communique_set:
             for i in range(0, 3):
                 communique = self.font.render(self.special_communique + str(3 - i), True, (255, 255, 255), None)
@@ -325,24 +624,32 @@ class Game(object):
             self.is_special_communique_set = False
             self.special_communique = ''
             self.first_after_pause = True
-        pygame.display.flip()
 
 
 def run_game():
-    main_menu.disable()
+    global game
+    game = Game(game_screen, game_clock, TILE_SIZE, 'classic', shortest_path_targeting)
     game.main_loop()
+    main_menu.disable()
 
 
 def run_random_game():
     global game
-    game = Game(game_screen, game_clock, TILE_SIZE, 'prim')
+    game = Game(game_screen, game_clock, TILE_SIZE, 'prim', shortest_path_targeting)
     game.main_loop()
     main_menu.disable()
 
 
 def run_wall_game():
     global game
-    game = Game(game_screen, game_clock, TILE_SIZE, 'wall')
+    game = Game(game_screen, game_clock, TILE_SIZE, 'wall', shortest_path_targeting)
+    game.main_loop()
+    main_menu.disable()
+
+
+def run_large_game():
+    global game
+    game = Game(game_screen, game_clock, TILE_SIZE, 'prim', shortest_path_targeting, LARGE_BOARD_SIZE)
     game.main_loop()
     main_menu.disable()
 
@@ -350,31 +657,24 @@ def run_wall_game():
 def new_game():
     game_over_menu.disable()
     pause_menu.disable()
-    game.advance_to_next_level()
-    game.pause = False
-    game.first_after_pause = True
-    game.status.reset()
+    game.start_new_game()
     game.main_loop()
 
 
 def next_level():
     level_completed_menu.disable()
-    game.advance_to_next_level()
-    game.pause = False
-    game.first_after_pause = True
+    game.start_next_level()
     game.main_loop()
 
 
 def pause_game():
     game.pause = True
-    game.pause_start_ticks = pygame.time.get_ticks()
     pause_menu.enable()
 
 
 def resume_game():
     pause_menu.disable()
     game.pause = False
-    game.pause_end_ticks = pygame.time.get_ticks()
     game.first_after_pause = True
     game.main_loop()
 
@@ -407,7 +707,32 @@ def create_menu(title, bgfun, alpha):
                            window_width=SCREEN_RESOLUTION[0], draw_select=False)
 
 
+def preload_assets(report):
+    # everything the classic board needs, the menu does not wait for it
+    paths = [Pacman.TEXTURE_PATH, Ghost.VULNERABLE_TEXTURES_PATH, board.Board.TILES_PATH, hud.Hud.LIFE_TEXTURE_PATH] + \
+        [Ghost.TEXTURES_PATH % name.name for name in GhostNames]
+
+    def prepare_classic_background():
+        board.Board(TILE_SIZE, game_screen, board.ClassicLayout())  # rendered background is kept in the cache
+        report.mark('assets preloaded')
+
+    assets.preload(paths, prepare_classic_background)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=TITLE)
+    parser.add_argument('--startup-report', action='store_true',
+                        help='prints how long it takes to get through startup, e.g. to show the first menu frame')
+    parser.add_argument('--backgrounds-cache', default=None, metavar='DIRECTORY',
+                        help='keeps rendered backgrounds of boards in the directory, so later runs do not render them')
+    parser.add_argument('--shortest-path-targeting', action='store_true',
+                        help='ghosts chase their targets along shortest paths, instead of straight line distances')
+    arguments = parser.parse_args()
+    board.backgrounds_directory = arguments.backgrounds_cache
+    shortest_path_targeting = arguments.shortest_path_targeting
+    startup = profiler.StartupReport(STARTED, sys.stdout if arguments.startup_report else None)
+    startup.mark('imports')
+
     os.environ['SDL_VIDEO_CENTERED'] = '1'  # displays the window in the center
 
     pygame.init()
@@ -415,27 +740,25 @@ if __name__ == "__main__":
 
     game_screen = pygame.display.set_mode(SCREEN_RESOLUTION)
     game_clock = pygame.time.Clock()
-    game = Game(game_screen, game_clock, TILE_SIZE)
+    startup.mark('display')
 
     # MAIN SCREEN BACKGROUND TEXTURES
-    pacman_texture = game.player.load_tile(game.player.texture, 10)
-    pacman_texture = pygame.transform.scale(pacman_texture, (80, 80))
-    ghost1_texture = game.monsters.get(GhostNames.blinky).load_tile(game.monsters.get(GhostNames.blinky).texture, 9)
-    ghost1_texture = pygame.transform.scale(ghost1_texture, (80, 80))
-    ghost2_texture = game.monsters.get(GhostNames.inky).load_tile(game.monsters.get(GhostNames.inky).texture, 16)
-    ghost2_texture = pygame.transform.scale(ghost2_texture, (80, 80))
-    ghost3_texture = game.monsters.get(GhostNames.pinky).load_tile(game.monsters.get(GhostNames.pinky).texture, 8)
-    ghost3_texture = pygame.transform.scale(ghost3_texture, (80, 80))
-    ghost3_texture = pygame.transform.flip(ghost3_texture, True, False)
-    ghost4_texture = game.monsters.get(GhostNames.clyde).load_tile(game.monsters.get(GhostNames.clyde).texture, 6)
-    ghost4_texture = pygame.transform.scale(ghost4_texture, (80, 80))
-    ghost4_texture = pygame.transform.flip(ghost4_texture, True, False)
+    # only these are loaded before the menu is shown, games are prepared when they are chosen
+    pacman_texture = assets.frame(Pacman.TEXTURE_PATH, Pacman.tile_rect(10), (80, 80))
+    ghost1_texture = assets.frame(Ghost.TEXTURES_PATH % GhostNames.blinky.name, Ghost.tile_rect(9), (80, 80))
+    ghost2_texture = assets.frame(Ghost.TEXTURES_PATH % GhostNames.inky.name, Ghost.tile_rect(16), (80, 80))
+    ghost3_texture = assets.frame(Ghost.TEXTURES_PATH % GhostNames.pinky.name, Ghost.tile_rect(8), (80, 80),
+                                  flipped=True)
+    ghost4_texture = assets.frame(Ghost.TEXTURES_PATH % GhostNames.clyde.name, Ghost.tile_rect(6), (80, 80),
+                                  flipped=True)
+    startup.mark('menu textures')
 
     # MAIN MENU
     main_menu = create_menu('Pacman', main_background, 100)
     main_menu.add_option('Classic', run_game)
     main_menu.add_option('Random maze', run_random_game)
     main_menu.add_option('Cross maze', run_wall_game)
+    main_menu.add_option('Large maze', run_large_game)
     main_menu.add_option('Quit', PYGAME_MENU_EXIT)
 
     # PAUSE MENU
@@ -457,6 +780,15 @@ if __name__ == "__main__":
     level_completed_menu.add_option('Quit', PYGAME_MENU_EXIT)
     level_completed_menu.disable()
 
+    startup.mark('menus')
+
+    # the first frame is drawn here, the main menu keeps drawing the next ones in its own loop
+    main_background()
+    main_menu.draw()
+    pygame.display.flip()
+    startup.mark('first menu frame')
+    preload_assets(startup)
+
     # Main loop
     while True:
         events = pygame.event.get()
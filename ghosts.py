@@ -11,94 +11,135 @@ class GhostNames(Enum):
 
 
 class Ghost(Character):
+    TEXTURES_PATH = './sheets/DinoSprites - %s.png'  # by the name of the ghost
+    VULNERABLE_TEXTURES_PATH = TEXTURES_PATH % 'vulnerable'  # shared by all the ghosts
+    TEXTURE_SIZE = 24
+    SPEED = 100
     DIRECTION_CHANGE_TIME_GAP = 100
+    DIRECTIONS_CACHE_SIZE = 4096  # decisions remembered by every board
 
     def __init__(self, board, color, *groups):
         super().__init__(board, *groups)
 
         # general attributes
+        self.color = color
         self.character_width = self.character_height = self.board.tile_size * 2
 
         # movement-related features
         self.position_tile = board.board_layout.ghost_spawns.get(color)
         self.set_position_to_tile_center()
-        self.speed = 100
+        self.speed = Ghost.SPEED
 
         # textures related attributes
-        texture_name = './sheets/DinoSprites - ' + color.name + '.png'
-        self.texture = pygame.image.load(texture_name)
-        self.texture_size = 24
+        self.texture_path = Ghost.TEXTURES_PATH % color.name
+        self.texture_size = Ghost.TEXTURE_SIZE
 
         self.idle_length = 4
-        self.idle_textures = [self.load_tile_scaled(self.texture, i) for i in range(0, 4)]
         self.kill_length = 7
-        self.kill_textures = [self.load_tile_scaled(self.texture, i) for i in range(4, 11)]
-
-        # textures used when ghosts are vulnerable
-        self.run_texture = pygame.image.load('./sheets/DinoSprites - vulnerable.png')
-        self.run_length = 7
-        self.run_textures = [self.load_tile_scaled(self.run_texture, i) for i in range(10, 17)]
+        self.run_length = 7  # textures used when ghosts are vulnerable
+        if board.game_screen is not None:  # headless boards are never drawn
+            self.load_textures()
 
         # ghost behaviour attributes
         self.is_killing = True
+        self.controlled = False  # directed by a player (over the network) instead of the AI
         self.chase_tile = None  # target tile when ghost is killing
         self.scatter_tile = None  # target tile when ghost is running (not killing)
 
         # necessary to prohibit ghost from reversing direction while chasing
-        self.direction_change_time = pygame.time.get_ticks()
-        self.board = board
+        self.direction_change_time = self.board.get_ticks()
 
     @staticmethod
     def calculate_distance_to_tile(from_tile, to_tile):
         return sqrt(pow(from_tile[0] - to_tile[0], 2) + pow(from_tile[1] - to_tile[1], 2))
 
-    def load_tile(self, texture, number_of_tile):
-        number_of_tile %= self.texture_size
-        tile_location_px = number_of_tile * self.texture_size
-        return texture.subsurface(tile_location_px, 0, self.texture_size, self.texture_size)
+    def calculate_path_distance_to_tile(self, from_tile, to_tile):
+        # falls back to straight line distance if there is no path (or shortest path targeting is off)
+        if self.board.distance_fields is not None:
+            distance = self.board.distance_fields.distance(from_tile, to_tile)
+            if distance is not None:
+                return distance
+        return Ghost.calculate_distance_to_tile(from_tile, to_tile)
+
+    def load_textures(self):
+        self.idle_textures = self.load_frames(self.texture_path, range(0, 4))
+        self.kill_textures = self.load_frames(self.texture_path, range(4, 11))
+        self.run_textures = self.load_frames(Ghost.VULNERABLE_TEXTURES_PATH, range(10, 17))
 
-    def update(self, dt, *args):
+    @staticmethod
+    def tile_rect(number_of_tile):
+        number_of_tile %= Ghost.TEXTURE_SIZE
+        tile_location_px = number_of_tile * Ghost.TEXTURE_SIZE
+        return tile_location_px, 0, Ghost.TEXTURE_SIZE, Ghost.TEXTURE_SIZE
+
+    @staticmethod
+    def ai_tick(ghosts, pacman, blinky):
+        """Single AI step of all the given ghosts, only those at decision points choose their directions"""
+        time = pacman.board.get_ticks()
+        for ghost in [ghost for ghost in ghosts if not ghost.controlled and ghost.at_decision_point(time)]:
+            ghost.update_target(pacman, blinky)
+            ghost.update_direction()
+
+    def at_decision_point(self, time):
+        # directions are only chosen close to tile centers, and not more often than the time gap allows
+        return time - self.direction_change_time >= Ghost.DIRECTION_CHANGE_TIME_GAP and self.safe_to_change_direction()
+
+    def update_target(self, pacman, blinky):
         if self.is_killing:
-            self.update_chase_tile(args[0], args[1])
+            self.update_chase_tile(pacman, blinky)
         else:
             self.chase_tile = self.scatter_tile
 
-        self.update_direction()
-        super().update(dt, *args)
+    def respawn(self):
+        self.position_tile = self.board.board_layout.ghost_spawns.get(self.color)
+        self.set_position_to_tile_center()
+        self.direction = Directions.UP
 
     def reverse_direction(self):
         self.direction = Directions.opposite_direction(self.direction)
-        self.direction_change_time = pygame.time.get_ticks()
+        self.direction_change_time = self.board.get_ticks()
 
     def update_direction(self):
-        time = pygame.time.get_ticks()
-        if time - self.direction_change_time < Ghost.DIRECTION_CHANGE_TIME_GAP:
-            return
-
-        if self.safe_to_change_direction():
-            chosen_direction = self.direction
-            chosen_distance = None
-
-            direction_tiles = [(direction, (self.position_tile[0] + switch[0], self.position_tile[1] + switch[1]))
-                               for (direction, switch) in Character.DIRECTION_SWITCH_MAP.items()]
-
-            direction_distances = [(direction, Ghost.calculate_distance_to_tile(tile, self.chase_tile))
-                                   for (direction, tile) in direction_tiles
-                                   if direction != Directions.opposite_direction(self.direction)
-                                   and tile in self.board.board_layout.accessible]
-
-            # chose shortest distance & corresponding direction
-            for (direction, distance) in direction_distances:
-                if chosen_distance is None or chosen_distance > distance:
-                    chosen_direction, chosen_distance = direction, distance
-
-            # reverse direction on dead ends
-            if chosen_distance is None and self.position_tile not in self.board.board_layout.ghost_path:
-                self.reverse_direction()
-            else:
-                self.direction = chosen_direction
-
-            self.direction_change_time = time
+        # decisions depend only on the tile, the direction and the target, so they are shared by all the ghosts
+        key = (self.position_tile, self.direction, self.chase_tile)
+        directions_cache = self.board.ghost_directions
+        if key in directions_cache:
+            directions_cache.move_to_end(key)
+        else:
+            directions_cache[key] = self.choose_direction(*key)
+            if len(directions_cache) > Ghost.DIRECTIONS_CACHE_SIZE:
+                directions_cache.popitem(last=False)
+
+        chosen_direction = directions_cache[key]
+        if chosen_direction is None:
+            self.reverse_direction()
+        else:
+            self.direction = chosen_direction
+            self.direction_change_time = self.board.get_ticks()
+
+    def choose_direction(self, tile, direction, target_tile):
+        """Direction leading closest to the target tile, None if the ghost has to turn back"""
+        chosen_direction = direction
+        chosen_distance = None
+
+        accessible = self.board.board_layout.accessible_directions(tile)
+        direction_tiles = [(next_direction, (tile[0] + switch[0], tile[1] + switch[1]))
+                           for (next_direction, switch) in Character.DIRECTION_SWITCH_MAP.items()
+                           if accessible & Directions.direction_bit(next_direction)]
+
+        direction_distances = [(next_direction, self.calculate_path_distance_to_tile(next_tile, target_tile))
+                               for (next_direction, next_tile) in direction_tiles
+                               if next_direction != Directions.opposite_direction(direction)]
+
+        # chose shortest distance & corresponding direction
+        for (next_direction, distance) in direction_distances:
+            if chosen_distance is None or chosen_distance > distance:
+                chosen_direction, chosen_distance = next_direction, distance
+
+        # reverse direction on dead ends
+        if chosen_distance is None and not self.board.board_layout.is_ghost_path(tile):
+            return None
+        return chosen_direction
 
     @abc.abstractmethod
     def update_chase_tile(self, pacman, blinky):
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+
+import pygame
+
+import assets
+
+COLOR_BLACK = (0, 0, 0)
+COLOR_WHITE = (255, 255, 255)
+
+
+class Hud(object):
+    """Information panel below the board, only its parts showing changed values are redrawn"""
+    PANEL_RECT = pygame.Rect(0, 776, 700, 125)
+    SCORE_RECT = pygame.Rect(0, 786, 480, 30)
+    LEVEL_RECT = pygame.Rect(0, 816, 480, 30)
+    KILLING_TIME_RECT = pygame.Rect(0, 846, 480, 30)
+    LIFE_TEXTURE_PATH = './sheets/life.png'
+    LIFE_SIZE = 40
+    TEXTS_CACHE_SIZE = 64  # rendered strings kept for reuse
+
+    def __init__(self, screen, font, max_lives):
+        self.screen = screen
+        self.font = font
+        self.life_texture = assets.frame(Hud.LIFE_TEXTURE_PATH, None, (Hud.LIFE_SIZE, Hud.LIFE_SIZE))
+        self.lives_rect = pygame.Rect(Hud.PANEL_RECT.right - max_lives * Hud.LIFE_SIZE, Hud.PANEL_RECT.top,
+                                      max_lives * Hud.LIFE_SIZE, Hud.LIFE_SIZE)
+        self.texts = OrderedDict()
+        self.shown = {}  # values currently visible on the screen, by field
+        self.panel_cleared = False
+
+    def invalidate(self):
+        """Makes the whole panel redrawn on next update, after something else has been drawn over it"""
+        self.shown = {}
+        self.panel_cleared = False
+
+    def render_text(self, text):
+        surface = self.texts.get(text)
+        if surface is None:
+            surface = self.font.render(text, True, COLOR_WHITE, None)
+            self.texts[text] = surface
+            if len(self.texts) > Hud.TEXTS_CACHE_SIZE:
+                self.texts.popitem(last=False)
+        else:
+            self.texts.move_to_end(text)
+        return surface
+
+    def update(self, points, level_number, lives, killing_time=None):
+        """Redraws fields whose values changed and returns the areas of the screen that were drawn on"""
+        dirty_rects = []
+        if not self.panel_cleared:
+            self.screen.fill(COLOR_BLACK, Hud.PANEL_RECT)
+            dirty_rects.append(Hud.PANEL_RECT)
+            self.panel_cleared = True
+
+        # the countdown is compared as shown, so it is redrawn only when the displayed digits change
+        killing_text = "KILLING TIME LEFT: %.2f s" % killing_time if killing_time is not None else ''
+        fields = [
+            ('score', 'SCORE:   ' + str(points), Hud.SCORE_RECT),
+            ('level', 'LEVEL:   ' + str(level_number), Hud.LEVEL_RECT),
+            ('killing_time', killing_text, Hud.KILLING_TIME_RECT)
+        ]
+        for name, text, rect in fields:
+            if self.shown.get(name) != text:
+                self.shown[name] = text
+                self.screen.fill(COLOR_BLACK, rect)
+                if text:
+                    self.screen.blit(self.render_text(text), rect.topleft)
+                dirty_rects.append(rect)
+
+        if self.shown.get('lives') != lives:
+            self.shown['lives'] = lives
+            self.screen.fill(COLOR_BLACK, self.lives_rect)
+            for i in range(0, lives):
+                self.screen.blit(self.life_texture, (self.lives_rect.right - Hud.LIFE_SIZE - (i * Hud.LIFE_SIZE),
+                                                     self.lives_rect.top))
+            dirty_rects.append(self.lives_rect)
+
+        return dirty_rects
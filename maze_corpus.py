@@ -0,0 +1,148 @@
+import argparse
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+from collections import namedtuple
+
+import board
+
+CORPUS_PATH = './mazes/%s.pmz'  # default corpus of every maze type
+
+MazeRecord = namedtuple('MazeRecord', ['seed', 'type', 'model', 'spawn', 'ghost_spawns', 'big_dots'])
+
+
+class MazeCorpus(object):
+    """Pre-generated mazes of a single size, stored in a binary file and read through mmap.
+
+    The file starts with a header (magic, version, width, height, number of records), followed by
+    fixed-size records: seed, maze type, pacman spawn, four ghost spawns, four big dots (as uint16 pairs)
+    and a bitmap of walls (one bit per tile, row by row). All numbers are little endian.
+    """
+    MAGIC = b'PMZC'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHHI')
+    RECORD_HEADER = struct.Struct('<QB18H')
+    TYPES = ['prim', 'wall']
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as corpus_file:
+            self.data = mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, width, height, self.count = MazeCorpus.HEADER.unpack_from(self.data, 0)
+        if magic != MazeCorpus.MAGIC or version != MazeCorpus.VERSION:
+            raise ValueError('%s is not a maze corpus (version %d)' % (path, MazeCorpus.VERSION))
+
+        self.size = (width, height)
+        self.record_size = MazeCorpus.record_size(self.size)
+        self.next_index = None
+
+    def __len__(self):
+        return self.count
+
+    @staticmethod
+    def record_size(size):
+        return MazeCorpus.RECORD_HEADER.size + (size[0] * size[1] + 7) // 8
+
+    def record_offset(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError('maze corpus index out of range')
+        return MazeCorpus.HEADER.size + index * self.record_size
+
+    def record(self, index):
+        offset = self.record_offset(index)
+        values = MazeCorpus.RECORD_HEADER.unpack_from(self.data, offset)
+        seed, type_index, points = values[0], values[1], values[2:]
+        tiles = [(points[i], points[i + 1]) for i in range(0, len(points), 2)]
+
+        width, height = self.size
+        bitmap = self.data[offset + MazeCorpus.RECORD_HEADER.size:offset + self.record_size]
+        model = [[(bitmap[(y * width + x) >> 3] >> ((y * width + x) & 7)) & 1 for x in range(width)]
+                 for y in range(height)]
+
+        return MazeRecord(seed, MazeCorpus.TYPES[type_index], model, tiles[0], tiles[1:5], tiles[5:9])
+
+    def prefetch(self, index):
+        """Asks the system to start loading given record in the background (where madvise is available)"""
+        if hasattr(self.data, 'madvise') and hasattr(mmap, 'MADV_WILLNEED'):
+            offset = self.record_offset(index)
+            page_start = offset - offset % mmap.PAGESIZE
+            self.data.madvise(mmap.MADV_WILLNEED, page_start, offset + self.record_size - page_start)
+
+    def random_layout(self):
+        # the record for the next start is chosen (and prefetched) in advance
+        index = self.next_index if self.next_index is not None else random.randrange(self.count)
+        self.next_index = random.randrange(self.count)
+        self.prefetch(self.next_index)
+        return board.GeneratedLayout.from_corpus(self, index)
+
+    def close(self):
+        self.data.close()
+
+
+def pack_record(layout):
+    width, height = layout.layout_size
+    bitmap = bytearray((width * height + 7) // 8)
+    for (i, j) in layout.walls:
+        bitmap[(j * width + i) >> 3] |= 1 << ((j * width + i) & 7)
+
+    ghost_spawns = [layout.ghost_spawns.get(name) for name in board.GeneratedLayout.ghost_names()]
+    points = [coordinate for tile in [layout.spawn] + ghost_spawns + layout.big_dots_indices for coordinate in tile]
+    return MazeCorpus.RECORD_HEADER.pack(layout.seed, MazeCorpus.TYPES.index(layout.type), *points) + bytes(bitmap)
+
+
+def generate_record(task):
+    maze_type, size, seed = task
+    return pack_record(board.GeneratedLayout(maze_type, size, seed))
+
+
+def write_corpus(path, maze_type, size, seeds, processes=None):
+    """Generates mazes for all the seeds in parallel and writes them into a new corpus file"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tasks = [(maze_type, size, seed) for seed in seeds]
+    with open(path, 'wb') as corpus_file, multiprocessing.Pool(processes) as pool:
+        corpus_file.write(MazeCorpus.HEADER.pack(MazeCorpus.MAGIC, MazeCorpus.VERSION, size[0], size[1], len(tasks)))
+        # records come back in order of seeds, so the index of every maze is known in advance
+        for record in pool.imap(generate_record, tasks, chunksize=64):
+            corpus_file.write(record)
+
+
+# corpora opened by this process, None for types without a corpus
+opened_corpora = {}
+
+
+def random_layout(maze_type, size):
+    """Loads a random maze of given type and size from its default corpus, or returns None if there is none"""
+    path = CORPUS_PATH % maze_type
+    if path not in opened_corpora:
+        opened_corpora[path] = MazeCorpus(path) if os.path.exists(path) else None
+
+    corpus = opened_corpora[path]
+    if corpus is None or corpus.size != tuple(size) or not len(corpus):
+        return None
+    return corpus.random_layout()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generates a corpus of seeded mazes.')
+    parser.add_argument('--type', default='prim', choices=MazeCorpus.TYPES)
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--size', type=int, nargs=2, default=list(board.GeneratedLayout.SIZE),
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--output', default=None, help='defaults to %s' % CORPUS_PATH)
+    parser.add_argument('--processes', type=int, default=None, help='defaults to the number of cores')
+    arguments = parser.parse_args(argv)
+
+    path = arguments.output or CORPUS_PATH % arguments.type
+    seeds = range(arguments.first_seed, arguments.first_seed + arguments.count)
+    write_corpus(path, arguments.type, tuple(arguments.size), seeds, arguments.processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,29 @@
-from random import randint, shuffle
+from array import array
+from random import Random
 
 
 class MazeGenerator:
     SIZE = (28, 31)
 
-    def __init__(self):
+    def __init__(self, size=SIZE, seed=None):
+        self.size = size
+        self.random = Random(seed)  # the same seed always gives the same maze
         self.maze_model = None
 
-    @staticmethod
-    def is_border(x, y):
-        return x == 0 or y == 0 or x == MazeGenerator.SIZE[0] - 1 or y == MazeGenerator.SIZE[1] - 1
+        # indices used by the wall model
+        self.neighbour_offsets = None
+        self.window_offsets = None
+        self.neighbour_walls = None
+        self.window_walls = None
+        self.empty_windows = None
+        self.empty_windows_positions = None
 
-    @staticmethod
-    def is_wall(x, y):
+    def is_border(self, x, y):
+        return x == 0 or y == 0 or x == self.size[0] - 1 or y == self.size[1] - 1
+
+    def is_wall(self, x, y):
         cell = x % 2 == 1 and y % 2 == 1
-        return MazeGenerator.is_border(x, y) or not cell
+        return self.is_border(x, y) or not cell
 
     @staticmethod
     def adjacent_points(v_graph):
@@ -25,115 +34,157 @@ class MazeGenerator:
 
         return [up_edge, down_edge, right_edge, left_edge]
 
-    def adjacent_edges(self, v_graph):
-        edges = self.adjacent_points(v_graph)
-        return [e for e in edges if self.maze_model[e[1]][e[0]] == 1 and not self.is_border(e[0], e[1])]
-
-    def adjacent_area(self, v_graph):
-        area = {v_graph}
-        to_be_checked = {v_graph}
-        while to_be_checked:
-            new_to_be_checked = set()
-            for v in to_be_checked:
-                adj = self.adjacent_points(v)
-                for p in adj:
-                    if p not in area and self.maze_model[p[1]][p[0]] == 0:
-                        area.add(p)
-                        new_to_be_checked.add(p)
-            to_be_checked = new_to_be_checked
-        return area
-
-    # a'la Prim Algorithm
+    # a'la Prim Algorithm, with incrementally maintained frontier of walls
     def prepare_prim_model(self):
-        width = MazeGenerator.SIZE[0]
-        height = MazeGenerator.SIZE[1]
-        self.maze_model = [[(1 if MazeGenerator.is_wall(x, y) else 0) for x in range(width)] for y in range(height)]
-
-        graph = [(i, j) for i in range(width) for j in range(height) if self.maze_model[j][i] == 0]
-
-        initial_vertex = graph[randint(0, len(graph) - 1)]
-        v_graph = {initial_vertex}
-        v_edges = self.adjacent_edges(initial_vertex)
-
-        print(self.adjacent_area(initial_vertex))
-
-        while not len(v_graph) == len(graph):
-            edge_i = randint(0, len(v_edges) - 1)
-            edge = v_edges[edge_i]
-
-            possible_vertices = [v for v in self.adjacent_points(edge) if v in graph and v not in v_graph]
-            if possible_vertices:
-                self.maze_model[edge[1]][edge[0]] = 0
-                zero_area = self.adjacent_area(initial_vertex)
-                v_graph = {v for v in zero_area if v in graph}
-                v_edges = list({edge for v in v_graph for edge in self.adjacent_edges(v)})
-
-    CHECK_LIST = [(col, row) for col in range(28 - 2) for row in range(31 - 2)]
-    shuffle(CHECK_LIST)
+        width = self.size[0]
+        height = self.size[1]
+
+        # flat model (one byte per tile), vertices of the graph lie on odd coordinates and walls between them are edges
+        columns = range(1, width - 1, 2)
+        rows = range(1, height - 1, 2)
+        model = bytearray(b'\x01') * (width * height)
+        for y in rows:
+            model[y * width + 1:(y + 1) * width - 1:2] = bytes(len(columns))
+
+        if columns and rows:
+            # marks visited vertices and every other tile, with two rows of padding so that no index goes out of it
+            padding = 2 * width
+            visited = bytearray(b'\x01') * padding + model + bytearray(b'\x01') * padding
+            frontier = []  # edges leading from visited vertices, as indices of the padded grid
+            random = self.random.random
+
+            vertex = padding + self.random.choice(rows) * width + self.random.choice(columns)
+            while vertex is not None:
+                # moving by two tiles from a vertex hits another vertex or a tile marked as visited
+                visited[vertex] = 1
+                if not visited[vertex - padding]:
+                    frontier.append(vertex - width)
+                if not visited[vertex + padding]:
+                    frontier.append(vertex + width)
+                if not visited[vertex + 2]:
+                    frontier.append(vertex + 1)
+                if not visited[vertex - 2]:
+                    frontier.append(vertex - 1)
+
+                vertex = None
+                while frontier and vertex is None:
+                    # remove random edge from the frontier in O(1), by replacing it with the last one
+                    edge_i = int(random() * len(frontier))
+                    edge = frontier[edge_i]
+                    frontier[edge_i] = frontier[-1]
+                    frontier.pop()
+
+                    # an edge joins vertices on its sides, the one that is not visited yet is visited through it
+                    if not visited[edge + 1]:
+                        vertex = edge + 1
+                    elif not visited[edge - 1]:
+                        vertex = edge - 1
+                    elif not visited[edge + width]:
+                        vertex = edge + width
+                    elif not visited[edge - width]:
+                        vertex = edge - width
+                    else:
+                        continue
+                    model[edge - padding] = 0
+
+        self.maze_model = [list(model[y * width:(y + 1) * width]) for y in range(height)]
+
+    def place_wall(self, x, y):
+        """Puts a wall on the tile, keeping wall counts of neighbourhoods and 3x3 windows up to date"""
+        if self.maze_model[y][x] == 1:
+            return
+        self.maze_model[y][x] = 1
+
+        width, height = self.size
+        tile = y * width + x
+        if 0 < x < width - 1 and 0 < y < height - 1:
+            neighbours = [tile + offset for offset in self.neighbour_offsets]
+        else:
+            neighbours = [j * width + i for j in range(max(y - 1, 0), min(y + 2, height))
+                          for i in range(max(x - 1, 0), min(x + 2, width)) if (i, j) != (x, y)]
+        for neighbour in neighbours:
+            self.neighbour_walls[neighbour] += 1
+
+        # windows containing the tile are the ones with top left tile at most two tiles up and left of it
+        if 2 <= x <= width - 3 and 2 <= y <= height - 3:
+            windows = [tile - offset for offset in self.window_offsets]
+        else:
+            windows = [row * width + col for row in range(max(y - 2, 0), min(y, height - 3) + 1)
+                       for col in range(max(x - 2, 0), min(x, width - 3) + 1)]
+        for window in windows:
+            if self.window_walls[window] == 0:
+                self.remove_empty_window(window)
+            self.window_walls[window] += 1
+
+    def remove_empty_window(self, window):
+        # swap with the last empty window, so removal is O(1)
+        position = self.empty_windows_positions[window]
+        if position < 0:
+            return
+        last_window = self.empty_windows[-1]
+        self.empty_windows[position] = last_window
+        self.empty_windows_positions[last_window] = position
+        self.empty_windows.pop()
+        self.empty_windows_positions[window] = -1
 
     def nine_nine_finder(self):
-        for col, row in MazeGenerator.CHECK_LIST:
-            ok = True
-            nine_area = [(col + c, row + r) for c in range(3) for r in range(3)]
-            for c, r in nine_area:
-                if self.maze_model[r][c] == 1:
-                    MazeGenerator.CHECK_LIST.remove((col, row))
-                    ok = False
-                    break
-
-            if ok:
-                MazeGenerator.CHECK_LIST.remove((col, row))
-                return col + 1, row + 1
+        # random 3x3 window without walls, its center is returned
+        if not self.empty_windows:
+            return None
 
-        return None
+        window = self.empty_windows[self.random.randint(0, len(self.empty_windows) - 1)]
+        self.remove_empty_window(window)
+        return window % self.size[0] + 1, window // self.size[0] + 1
 
     def check_cell_wall_model(self, cell, origin_cell):
         # cell is out of board
-        if not (0 < cell[0] < self.SIZE[0] - 1 and 0 < cell[1] < self.SIZE[1] - 1):
+        if not (0 < cell[0] < self.size[0] - 1 and 0 < cell[1] < self.size[1] - 1):
             return False
 
-        # check if placing cell would block some path
-        to_check = self.adjacent_points(cell)
-        corner_checks = [
-            (cell[0] - 1, cell[1] - 1),
-            (cell[0] - 1, cell[1] + 1),
-            (cell[0] + 1, cell[1] + 1),
-            (cell[0] + 1, cell[1] - 1),
-        ]
-        to_check.extend(corner_checks)
-
-        for point in to_check:
-            if 0 <= point[0] < self.SIZE[0] and 0 <= point[1] < self.SIZE[1]:
-                if point != origin_cell and self.maze_model[point[1]][point[0]] == 1:
-                    return False
-
-        # otherwise OK
-        return True
+        # placing cell would block some path if any of its neighbours (apart from origin cell) is a wall
+        origin_wall = self.maze_model[origin_cell[1]][origin_cell[0]]
+        return self.neighbour_walls[cell[1] * self.size[0] + cell[0]] - origin_wall == 0
 
     def prepare_wall_model(self):
-        width = MazeGenerator.SIZE[0]
-        height = MazeGenerator.SIZE[1]
-        self.maze_model = [[(1 if MazeGenerator.is_border(x, y) else 0) for x in range(width)] for y in range(height)]
-
-        build_cells = {(9, 12), (9, 20), (18, 12), (18, 20)}
+        width = self.size[0]
+        height = self.size[1]
+        self.maze_model = [[0] * width for y in range(height)]
+
+        # walls counted around every tile and in every 3x3 window (indexed by its top left tile)
+        self.neighbour_offsets = [j * width + i for j in (-1, 0, 1) for i in (-1, 0, 1) if (i, j) != (0, 0)]
+        self.window_offsets = [j * width + i for j in range(3) for i in range(3)]
+        self.neighbour_walls = bytearray(width * height)
+        self.window_walls = bytearray(width * height)
+        self.empty_windows = [row * width + col for row in range(height - 2) for col in range(width - 2)]
+        self.empty_windows_positions = array('l', [-1]) * (width * height)
+        for position, window in enumerate(self.empty_windows):
+            self.empty_windows_positions[window] = position
+
+        for x in range(width):
+            for y in range(height):
+                if self.is_border(x, y):
+                    self.place_wall(x, y)
+
+        build_cells = {(width // 3, 2 * height // 5), (width // 3, 2 * height // 3),
+                       (2 * width // 3, 2 * height // 5), (2 * width // 3, 2 * height // 3)}
         already_checked_cells = set()
 
         while len(build_cells):
             new_build_cells = set()
             for build_cell in build_cells:
                 already_checked_cells.add(build_cell)
-                self.maze_model[build_cell[1]][build_cell[0]] = 1
+                self.place_wall(build_cell[0], build_cell[1])
                 adjacent_list = self.adjacent_points(build_cell)
                 available_cells = [cell for cell in adjacent_list if self.check_cell_wall_model(cell, build_cell)]
 
-                shuffle(available_cells)
+                self.random.shuffle(available_cells)
 
                 for adj_cell in available_cells:
                     if adj_cell not in already_checked_cells:
                         new_build_cells.add(adj_cell)
-                        self.maze_model[adj_cell[1]][adj_cell[0]] = 1
+                        self.place_wall(adj_cell[0], adj_cell[1])
 
-                # find 9x9 empty place if no cells are available
+                # find 3x3 empty place if no cells are available
                 if not available_cells:
                     n = self.nine_nine_finder()
                     if n:
@@ -0,0 +1,398 @@
+import argparse
+import asyncio
+import struct
+import sys
+import time
+
+import pygame
+
+import board
+import game
+import replay
+from characters import Directions
+from ghosts import GhostNames
+from simulation import Simulation
+
+DEFAULT_PORT = 5757
+SNAPSHOT_STEPS = 3  # snapshots are sent after every that many steps of the game (30 times per second)
+
+# every message starts with its type and the length of the rest of it
+MESSAGE_HEADER = struct.Struct('<BH')
+HELLO = 1  # sent by the server to a player who joined: role, layout type and size, seed and tile size
+SNAPSHOT = 2  # sent by the server: changes in the state of the game
+INPUT = 3  # sent by a player: direction chosen with the arrow keys, 0 if none
+HELLO_MESSAGE = struct.Struct('<BBHHQB')
+INPUT_MESSAGE = struct.Struct('<B')
+
+# roles of the players of a session
+PACMAN = 0
+GHOST = 1
+
+
+def pack_message(kind, payload):
+    return MESSAGE_HEADER.pack(kind, len(payload)) + payload
+
+
+async def read_message(reader):
+    kind, length = MESSAGE_HEADER.unpack(await reader.readexactly(MESSAGE_HEADER.size))
+    return kind, await reader.readexactly(length)
+
+
+def prepare_layout(layout_type, size, seed):
+    if layout_type == 'classic':
+        return board.ClassicLayout()
+    return board.GeneratedLayout(layout_type, size, seed)
+
+
+class SnapshotEncoder(object):
+    """Encodes the state of a game as snapshots of what has changed since the previous snapshot (for one player).
+
+    A snapshot starts with the number of the step, a mask of the characters that changed and flags of the other
+    parts it contains. Changed characters follow (position and direction, with running and killing bits), then
+    the game status (points, level, lives and killing time left in ms) and dots eaten since the last snapshot
+    (as index << 2 | dot), possibly after all the dots were put back. All numbers are little endian.
+    """
+    HEADER = struct.Struct('<IBB')
+    CHARACTER = struct.Struct('<ddB')  # positions as doubles, the same as on the server
+    STATUS = struct.Struct('<IHBH')
+    DOTS_COUNT = struct.Struct('<H')
+    DOT = struct.Struct('<I')
+
+    # flags of snapshots
+    STATUS_CHANGED = 1
+    DOTS_RESET = 2
+    DOTS_EATEN = 4
+
+    # bits of character directions
+    RUNNING_BIT = 8
+    KILLING_BIT = 16
+    DIRECTION_MASK = 7
+
+    NO_KILLING_TIME = 0xffff
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.characters = [simulation.player] + list(simulation.monsters.values())
+
+        # what the player has already been sent
+        self.sent_characters = [None] * len(self.characters)
+        self.sent_status = None
+        self.sent_dots_resets = simulation.dots.resets - 1  # the first snapshot puts all the dots on the board
+        self.sent_dots_eaten = 0
+
+    @staticmethod
+    def character_state(character):
+        flags = character.direction.value
+        if character.is_running:
+            flags |= SnapshotEncoder.RUNNING_BIT
+        if character.is_killing:
+            flags |= SnapshotEncoder.KILLING_BIT
+        return character.position[0], character.position[1], flags
+
+    def status_state(self):
+        status = self.simulation.status
+        killing_time = SnapshotEncoder.NO_KILLING_TIME
+        if self.simulation.player.is_killing and status.killing_activated_time is not None:
+            killing_time = game.GameStatus.KILLING_DURATION * 1000 - \
+                (self.simulation.get_ticks() - status.killing_activated_time)
+            killing_time = max(0, min(SnapshotEncoder.NO_KILLING_TIME - 1, killing_time))
+        return status.player_points, status.level_number, status.player_lives, killing_time
+
+    def encode(self, step):
+        """Snapshot of the changes since the previous one, None if nothing has changed"""
+        mask = 0
+        flags = 0
+        parts = []
+
+        for i, character in enumerate(self.characters):
+            state = SnapshotEncoder.character_state(character)
+            if state != self.sent_characters[i]:
+                self.sent_characters[i] = state
+                mask |= 1 << i
+                parts.append(SnapshotEncoder.CHARACTER.pack(*state))
+
+        status = self.status_state()
+        if status != self.sent_status:
+            self.sent_status = status
+            flags |= SnapshotEncoder.STATUS_CHANGED
+            parts.append(SnapshotEncoder.STATUS.pack(*status))
+
+        # dots are only ever eaten, until all of them are put back on the board
+        dots = self.simulation.dots
+        if dots.resets != self.sent_dots_resets:
+            self.sent_dots_resets = dots.resets
+            self.sent_dots_eaten = 0
+            flags |= SnapshotEncoder.DOTS_RESET
+        if len(dots.eaten) > self.sent_dots_eaten:
+            eaten = dots.eaten[self.sent_dots_eaten:]
+            self.sent_dots_eaten = len(dots.eaten)
+            flags |= SnapshotEncoder.DOTS_EATEN
+            parts.append(SnapshotEncoder.DOTS_COUNT.pack(len(eaten)))
+            parts.append(struct.pack('<%dI' % len(eaten), *eaten))
+
+        if not mask and not flags:
+            return None
+        return SnapshotEncoder.HEADER.pack(step, mask, flags) + b''.join(parts)
+
+
+class RemoteView(object):
+    """State of a game hosted by the server, kept up to date with received snapshots"""
+
+    def __init__(self, dots, characters_number=5):
+        self.dots = dots  # dots of the board the game is shown on
+        self.characters = [None] * characters_number  # (x, y, direction with flags) as in the last snapshot
+        self.previous_positions = [None] * characters_number
+        self.status = None
+        self.step = None
+        self.received_time = None
+        self.snapshot_interval = SNAPSHOT_STEPS * game.Game.STEP_DT
+
+    def apply(self, snapshot, now):
+        self.step, mask, flags = SnapshotEncoder.HEADER.unpack_from(snapshot, 0)
+        offset = SnapshotEncoder.HEADER.size
+
+        # characters are shown between their positions from the last two snapshots
+        self.previous_positions = [state[:2] if state is not None else None for state in self.characters]
+        for i in range(len(self.characters)):
+            if mask & (1 << i):
+                self.characters[i] = SnapshotEncoder.CHARACTER.unpack_from(snapshot, offset)
+                offset += SnapshotEncoder.CHARACTER.size
+
+        if flags & SnapshotEncoder.STATUS_CHANGED:
+            self.status = SnapshotEncoder.STATUS.unpack_from(snapshot, offset)
+            offset += SnapshotEncoder.STATUS.size
+
+        if flags & SnapshotEncoder.DOTS_RESET:
+            self.dots.reset()
+        if flags & SnapshotEncoder.DOTS_EATEN:
+            count, = SnapshotEncoder.DOTS_COUNT.unpack_from(snapshot, offset)
+            offset += SnapshotEncoder.DOTS_COUNT.size
+            for eaten in struct.unpack_from('<%dI' % count, snapshot, offset):
+                self.dots.remove(eaten >> 2, eaten & 3)
+
+        self.received_time = now
+
+    def alpha(self, now):
+        # part of the interval between snapshots passed since the last one
+        if self.received_time is None:
+            return 1.0
+        return min(1.0, (now - self.received_time) / self.snapshot_interval)
+
+    def killing_time(self):
+        if self.status is None or self.status[3] == SnapshotEncoder.NO_KILLING_TIME:
+            return None
+        return self.status[3] / 1000.0
+
+    def update_characters(self, characters):
+        """Moves given characters (pacman first, then ghosts) to their received positions"""
+        for character, state, previous_position in zip(characters, self.characters, self.previous_positions):
+            if state is None:
+                continue
+            x, y, flags = state
+            character.previous_position = previous_position or (x, y)
+            character.position = (x, y)
+            character.position_tile = x // character.board.tile_size, y // character.board.tile_size
+            character.direction = Directions(flags & SnapshotEncoder.DIRECTION_MASK)
+            character.is_running = flags & SnapshotEncoder.RUNNING_BIT != 0
+            character.is_killing = flags & SnapshotEncoder.KILLING_BIT != 0
+
+
+class Player(object):
+    def __init__(self, role, writer, simulation):
+        self.role = role
+        self.writer = writer
+        self.encoder = SnapshotEncoder(simulation)
+        self.direction = None  # chosen with the arrow keys, kept until the player chooses another one
+
+
+class Session(object):
+    """Game hosted by the server, its pacman and one of its ghosts are controlled by the players who joined it"""
+
+    def __init__(self, layout, tile_size):
+        self.simulation = Simulation(layout, tile_size)
+        self.simulation.reset()
+        self.ghost = self.simulation.monsters.get(GhostNames.blinky)
+        self.players = {}  # by role
+
+    def free_role(self):
+        for role in (PACMAN, GHOST):
+            if role not in self.players:
+                return role
+        return None
+
+    def join(self, role, writer):
+        player = Player(role, writer, self.simulation)
+        self.players[role] = player
+        if role == GHOST:
+            self.ghost.controlled = True
+        return player
+
+    def leave(self, player):
+        del self.players[player.role]
+        if player.role == GHOST:
+            self.ghost.controlled = False
+
+    def step(self):
+        ghost_player = self.players.get(GHOST)
+        if ghost_player is not None and ghost_player.direction is not None:
+            self.ghost.change_direction(ghost_player.direction)
+
+        pacman_player = self.players.get(PACMAN)
+        self.simulation.step(pacman_player.direction if pacman_player is not None else None)
+        if self.simulation.game_over:
+            self.simulation.reset()
+
+    def send_snapshots(self, step):
+        for player in self.players.values():
+            # snapshots are skipped for players who do not keep up, the next ones hold all the changes anyway
+            if player.writer.transport.get_write_buffer_size() > Server.MAX_BUFFERED:
+                continue
+            snapshot = player.encoder.encode(step)
+            if snapshot is not None:
+                player.writer.write(pack_message(SNAPSHOT, snapshot))
+
+
+class Server(object):
+    """Hosts many sessions in a single process, all of them advanced by one loop with the game's fixed time step"""
+    MAX_BUFFERED = 64 * 1024  # bytes waiting to be sent to a player
+
+    def __init__(self, layout, tile_size=game.TILE_SIZE):
+        self.layout = layout  # shared by the boards of all the sessions
+        self.tile_size = tile_size
+        self.sessions = []
+        self.steps = 0
+        self.running = False
+
+    def find_session(self):
+        for session in self.sessions:
+            role = session.free_role()
+            if role is not None:
+                return session, role
+        session = Session(self.layout, self.tile_size)
+        self.sessions.append(session)
+        return session, PACMAN
+
+    def hello(self, role):
+        return HELLO_MESSAGE.pack(role, replay.ReplayRecorder.layout_type_index(self.layout),
+                                  self.layout.layout_size[0], self.layout.layout_size[1],
+                                  getattr(self.layout, 'seed', None) or 0, self.tile_size)
+
+    async def handle_player(self, reader, writer):
+        session, role = self.find_session()
+        player = session.join(role, writer)
+        writer.write(pack_message(HELLO, self.hello(role)))
+        try:
+            while True:
+                kind, payload = await read_message(reader)
+                if kind == INPUT:
+                    direction, = INPUT_MESSAGE.unpack(payload)
+                    player.direction = Directions(direction) if direction else None
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            session.leave(player)
+            if not session.players:
+                self.sessions.remove(session)
+            writer.close()
+
+    def tick(self):
+        for session in self.sessions:
+            session.step()
+        self.steps += 1
+        if self.steps % SNAPSHOT_STEPS == 0:
+            for session in self.sessions:
+                session.send_snapshots(self.steps)
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_player, host, port)
+        loop = asyncio.get_running_loop()
+        self.running = True
+        async with server:
+            next_step = loop.time()
+            while self.running:
+                self.tick()
+                next_step += game.Game.STEP_DT
+                delay = next_step - loop.time()
+                if delay < -game.Game.MAX_FRAME_TIME:
+                    next_step = loop.time()  # too far behind, the time is dropped instead of simulated in a burst
+                await asyncio.sleep(max(0.0, delay))
+
+
+async def play(host, port):
+    """Joins a session of the server and shows its game in a window, the arrow keys control pacman or the ghost"""
+    reader, writer = await asyncio.open_connection(host, port)
+    kind, payload = await read_message(reader)
+    role, layout_type, width, height, seed, tile_size = HELLO_MESSAGE.unpack(payload)
+    layout = prepare_layout(replay.ReplayRecorder.LAYOUT_TYPES[layout_type], (width, height), seed)
+
+    pygame.init()
+    pygame.display.set_caption('%s (%s)' % (game.TITLE, 'pacman' if role == PACMAN else 'ghost'), game.ICON_TITLE)
+    screen = pygame.display.set_mode(game.SCREEN_RESOLUTION)
+    shown = game.Game(screen, pygame.time.Clock(), tile_size, layout)
+    characters = [shown.player] + list(shown.monsters.values())
+    view = RemoteView(shown.dots, len(characters))
+
+    async def receive():
+        while True:
+            message_kind, message = await read_message(reader)
+            if message_kind == SNAPSHOT:
+                view.apply(message, time.perf_counter())
+
+    receiving = asyncio.ensure_future(receive())
+    if shown.viewport is None:
+        shown.alive_group.clear(screen, shown.dots.layer)
+    dots_resets = shown.dots.resets
+    shown.refresh_game_screen()
+
+    direction = None
+    try:
+        while not receiving.done():
+            if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                break
+            chosen = shown.read_direction()
+            if chosen != direction:
+                direction = chosen
+                writer.write(pack_message(INPUT, INPUT_MESSAGE.pack(chosen.value if chosen is not None else 0)))
+
+            if view.status is not None:
+                if shown.dots.resets != dots_resets:
+                    dots_resets = shown.dots.resets
+                    shown.refresh_game_screen()  # all the dots are back
+                view.update_characters(characters)
+                shown.draw_sprites(view.alpha(time.perf_counter()))
+                points, level_number, lives, _ = view.status
+                shown.compositor.add(shown.hud.update(points, level_number, lives, view.killing_time()))
+                shown.compositor.present()
+            await asyncio.sleep(game.Game.STEP_DT)
+    finally:
+        receiving.cancel()
+        writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Two players game: pacman and a ghost, joined over the network.')
+    subparsers = parser.add_subparsers(dest='command')
+    serve_parser = subparsers.add_parser('serve', help='hosts games, the first player to join is pacman')
+    serve_parser.add_argument('--layout', default='classic', choices=replay.ReplayRecorder.LAYOUT_TYPES)
+    serve_parser.add_argument('--seed', type=int, default=0, help='seed of generated layouts')
+    join_parser = subparsers.add_parser('join', help='joins a game hosted by the server')
+    for subparser in (serve_parser, join_parser):
+        subparser.add_argument('--host', default='127.0.0.1')
+        subparser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    arguments = parser.parse_args(argv)
+
+    if arguments.command == 'serve':
+        if not 0 <= arguments.seed < 2 ** 64:
+            parser.error('--seed has to be between 0 and 2^64 - 1, it is sent to the players as unsigned 64 bits')
+        layout = prepare_layout(arguments.layout, board.GeneratedLayout.SIZE, arguments.seed)
+        asyncio.run(Server(layout).serve(arguments.host, arguments.port))
+    elif arguments.command == 'join':
+        asyncio.run(play(arguments.host, arguments.port))
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+from array import array
+from collections import OrderedDict, deque
+
+from characters import Character, Directions
+
+
+class DistanceFields(object):
+    UNREACHABLE = 0xFFFF
+    CACHE_SIZE = 512  # number of distance fields (one per target tile) kept in memory
+
+    def __init__(self, layout, cache_size=CACHE_SIZE):
+        self.layout = layout
+        self.cache_size = cache_size
+        self.fields = OrderedDict()
+        self.nearest_tiles = {}  # closest accessible tiles of inaccessible ones, at most one per tile of the board
+
+        # offsets of neighbouring tiles in the layout grid, paired with direction bits
+        self.neighbour_offsets = [(Directions.direction_bit(direction), dy * layout.grid_width + dx)
+                                  for direction, (dx, dy) in Character.DIRECTION_SWITCH_MAP.items()]
+
+    def distance(self, from_tile, to_tile):
+        """Returns the length of the shortest path between tiles, or None if there is none"""
+        index = self.layout.tile_index(from_tile)
+        if index is None:
+            return None
+
+        distance = self.field(to_tile)[index]
+        return None if distance == DistanceFields.UNREACHABLE else distance
+
+    def field(self, target_tile):
+        target_tile = self.nearest_accessible_tile(target_tile)
+        field = self.fields.get(target_tile)
+        if field is not None:
+            self.fields.move_to_end(target_tile)
+            return field
+
+        field = self.prepare_field(target_tile)
+        self.fields[target_tile] = field
+        if len(self.fields) > self.cache_size:
+            self.fields.popitem(last=False)
+        return field
+
+    def nearest_accessible_tile(self, tile):
+        # targets may point into walls or outside the board, so they are moved onto the closest accessible tile
+        width, height = self.layout.layout_size
+        tile = min(max(int(tile[0]), 0), width - 1), min(max(int(tile[1]), 0), height - 1)
+        if self.layout.is_accessible(tile) or not self.layout.accessible:
+            return tile
+
+        nearest = self.nearest_tiles.get(tile)
+        if nearest is None:
+            nearest = min(self.layout.accessible, key=lambda t: pow(t[0] - tile[0], 2) + pow(t[1] - tile[1], 2))
+            self.nearest_tiles[tile] = nearest
+        return nearest
+
+    def prepare_field(self, target_tile):
+        # breadth first search over accessible tiles, starting from the target
+        field = array('H', [DistanceFields.UNREACHABLE]) * len(self.layout.tile_grid)
+        masks = self.layout.accessible_masks
+
+        start = self.layout.tile_index(target_tile)
+        field[start] = 0
+        to_be_checked = deque([start])
+        while to_be_checked:
+            index = to_be_checked.popleft()
+            distance = field[index] + 1
+            for bit, offset in self.neighbour_offsets:
+                if masks[index] & bit and field[index + offset] == DistanceFields.UNREACHABLE:
+                    field[index + offset] = distance
+                    to_be_checked.append(index + offset)
+
+        return field
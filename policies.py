@@ -0,0 +1,63 @@
+import random
+from collections import deque
+
+from characters import Character, Directions
+
+
+class RandomPolicy(object):
+    """Keeps pacman going in a random direction, picking a new one from time to time"""
+    CHANGE_PROBABILITY = 0.03
+
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+        self.direction = None
+
+    def __call__(self, simulation):
+        if self.direction is None or self.random.random() < RandomPolicy.CHANGE_PROBABILITY:
+            self.direction = self.random.choice(list(Directions))
+        return self.direction
+
+
+class GreedyDotPolicy(object):
+    """Leads pacman along the shortest path to the closest remaining dot"""
+
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+        self.last_tile = None
+        self.direction = None
+
+    def __call__(self, simulation):
+        # a new decision is only needed after pacman enters another tile
+        tile = simulation.player.position_tile
+        if tile != self.last_tile:
+            self.last_tile = tile
+            self.direction = self.closest_dot_direction(simulation) or self.random.choice(list(Directions))
+        return self.direction
+
+    @staticmethod
+    def closest_dot_direction(simulation):
+        layout = simulation.board.board_layout
+        start = int(simulation.player.position_tile[0]), int(simulation.player.position_tile[1])
+
+        # breadth first search, remembering the first step taken towards every tile
+        first_steps = {start: None}
+        to_be_checked = deque([start])
+        while to_be_checked:
+            tile = to_be_checked.popleft()
+            if tile != start and simulation.dots.has_dot(tile):
+                return first_steps[tile]
+
+            passable = layout.passable_directions(tile)
+            for direction, (dx, dy) in Character.DIRECTION_SWITCH_MAP.items():
+                next_tile = tile[0] + dx, tile[1] + dy
+                if passable & Directions.direction_bit(direction) and next_tile not in first_steps:
+                    first_steps[next_tile] = first_steps[tile] or direction
+                    to_be_checked.append(next_tile)
+
+        return None
+
+
+POLICIES = {
+    'random': RandomPolicy,
+    'greedy': GreedyDotPolicy
+}
@@ -0,0 +1,183 @@
+import time
+from array import array
+from contextlib import contextmanager
+
+import pygame
+
+
+class FrameProfiler(object):
+    """Measures how long every phase of a frame takes, keeping the last frames in a fixed-size ring buffer"""
+    CAPACITY = 1024  # frames kept
+    SPARKLINE_FRAMES = 180
+    OVERLAY_COLOR = (0, 0, 0)  # opaque, as it is drawn again over itself
+    TEXT_COLOR = (255, 255, 255)
+    BAR_COLOR = (0, 200, 0)
+    SLOW_BAR_COLOR = (220, 40, 40)
+
+    def __init__(self, phases, frame_budget, idle_phases=(), capacity=CAPACITY, clock=time.perf_counter):
+        self.phases = list(phases)
+        self.phase_columns = {name: column for column, name in enumerate(self.phases)}
+        self.idle_columns = [self.phase_columns[name] for name in idle_phases]  # not counted in frame times
+        self.frame_budget = frame_budget  # in seconds, frames longer than that are marked on the sparkline
+        self.capacity = capacity
+        self.clock = clock
+
+        # every row: frame start, phases durations, phases starts (since the frame start), whole frame duration
+        # all in seconds
+        self.row_size = 2 * len(self.phases) + 2
+        self.rows = array('d', [0.0]) * (capacity * self.row_size)
+        self.frames = 0  # number of finished frames, also the number of the next one
+        self.frame_start = None
+
+    def row_offset(self, frame):
+        return (frame % self.capacity) * self.row_size
+
+    def start_frame(self):
+        offset = self.row_offset(self.frames)
+        for i in range(offset, offset + self.row_size):
+            self.rows[i] = 0.0
+        self.frame_start = self.clock()
+        self.rows[offset] = self.frame_start
+
+    def end_frame(self):
+        if self.frame_start is None:
+            return
+        offset = self.row_offset(self.frames)
+        idle_time = sum(self.rows[offset + 1 + column] for column in self.idle_columns)
+        self.rows[offset + self.row_size - 1] = self.clock() - self.frame_start - idle_time
+        self.frame_start = None
+        self.frames += 1
+
+    def cancel_frame(self):
+        # frames spent in menus are not measured
+        self.frame_start = None
+
+    @contextmanager
+    def phase(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            if self.frame_start is not None:
+                offset = self.row_offset(self.frames) + 1 + self.phase_columns[name]
+                if self.rows[offset] == 0.0:
+                    self.rows[offset + len(self.phases)] = start - self.frame_start
+                self.rows[offset] += self.clock() - start
+
+    def kept_frames(self):
+        return range(max(0, self.frames - self.capacity), self.frames)
+
+    def column(self, column, frames=None):
+        frames = self.kept_frames() if frames is None else frames
+        return [self.rows[self.row_offset(frame) + column] for frame in frames]
+
+    def frame_times(self, frames=None):
+        return self.column(self.row_size - 1, frames)
+
+    def phase_times(self, name):
+        return self.column(1 + self.phase_columns[name])
+
+    @staticmethod
+    def percentile(values, percent):
+        if not values:
+            return 0.0
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+    def summary(self):
+        """p50 and p99 (in ms) of the whole frame and of every phase, over the kept frames"""
+        summary = [('frame', self.frame_times())] + [(name, self.phase_times(name)) for name in self.phases]
+        return [(name, 1000 * FrameProfiler.percentile(values, 50), 1000 * FrameProfiler.percentile(values, 99))
+                for name, values in summary]
+
+    def render_overlay(self, font):
+        # rows of name, p50 and p99 cells, laid out in columns as the font may not be monospace
+        rows = [[font.render(text, True, FrameProfiler.TEXT_COLOR)
+                 for text in (name, 'p50 %.2f' % p50, 'p99 %.2f ms' % p99)]
+                for name, p50, p99 in self.summary()]
+        columns_widths = [max(row[i].get_width() for row in rows) + 10 for i in range(3)]
+        line_height = font.get_linesize()
+        sparkline_height = 40
+        width = max(sum(columns_widths) + 10, FrameProfiler.SPARKLINE_FRAMES + 10)
+
+        overlay = pygame.Surface((width, len(rows) * line_height + sparkline_height + 15))
+        overlay.fill(FrameProfiler.OVERLAY_COLOR)
+        for i, row in enumerate(rows):
+            x = 5
+            for cell, column_width in zip(row, columns_widths):
+                overlay.blit(cell, (x, 5 + i * line_height))
+                x += column_width
+
+        # one bar per frame, the full height is twice the frame budget
+        bottom = overlay.get_height() - 5
+        frames = range(max(0, self.frames - FrameProfiler.SPARKLINE_FRAMES), self.frames)
+        for x, frame_time in enumerate(self.frame_times(frames)):
+            height = min(sparkline_height, int(sparkline_height * frame_time / (2 * self.frame_budget)))
+            color = FrameProfiler.SLOW_BAR_COLOR if frame_time > self.frame_budget else FrameProfiler.BAR_COLOR
+            pygame.draw.line(overlay, color, (5 + x, bottom), (5 + x, bottom - height))
+        pygame.draw.line(overlay, FrameProfiler.TEXT_COLOR, (5, bottom - sparkline_height // 2),
+                         (5 + FrameProfiler.SPARKLINE_FRAMES, bottom - sparkline_height // 2))
+        return overlay
+
+    def records(self):
+        """Kept frames as dictionaries, times in ms (frame totals without idle phases)"""
+        records = []
+        for frame in self.kept_frames():
+            offset = self.row_offset(frame)
+            record = {'frame': frame, 'start': 1000 * self.rows[offset]}
+            for name, column in self.phase_columns.items():
+                record[name] = 1000 * self.rows[offset + 1 + column]
+                record[name + ' start'] = 1000 * self.rows[offset + 1 + len(self.phases) + column]
+            record['total'] = 1000 * self.rows[offset + self.row_size - 1]
+            records.append(record)
+        return records
+
+    def export_csv(self, path):
+        import csv  # exports are rare, modules used by them are not imported at startup
+
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, ['frame', 'start'] + self.phases + ['total'], extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self.records())
+
+    def export_json(self, path):
+        import json
+
+        with open(path, 'w') as json_file:
+            json.dump({'phases': self.phases, 'frames': self.records()}, json_file)
+
+    def export_chrome_trace(self, path):
+        """Writes kept frames in the trace event format, readable by chrome://tracing and Perfetto"""
+        import json
+
+        events = []
+        for record in self.records():
+            start = record['start'] * 1000  # in microseconds
+            # frame events span all the phases, idle ones included
+            end = max(record[name + ' start'] + record[name] for name in self.phases) * 1000
+            events.append({'name': 'frame', 'ph': 'X', 'ts': start, 'dur': end,
+                           'pid': 1, 'tid': 1, 'args': {'frame': record['frame'], 'busy': record['total']}})
+            for name in self.phases:
+                if record[name] > 0:
+                    events.append({'name': name, 'ph': 'X', 'ts': start + record[name + ' start'] * 1000,
+                                   'dur': record[name] * 1000, 'pid': 1, 'tid': 1})
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+
+
+class StartupReport(object):
+    """Times at which startup milestones are reached, since the given start, written out as soon as they are"""
+
+    def __init__(self, start, stream=None, clock=time.perf_counter):
+        self.start = start
+        self.stream = stream  # None keeps the report quiet
+        self.clock = clock
+        self.milestones = []
+
+    def mark(self, name):
+        # milestones may be reached on other threads too, e.g. when assets are preloaded
+        elapsed = self.clock() - self.start
+        self.milestones.append((name, elapsed))
+        if self.stream is not None:
+            self.stream.write('%-24s %8.1f ms\n' % (name, 1000 * elapsed))
+            self.stream.flush()
@@ -0,0 +1,186 @@
+import argparse
+import os
+import struct
+import sys
+import time
+
+import pygame
+
+import board
+import game
+from characters import Directions
+
+
+class ReplayRecorder(object):
+    """Records everything a game depends on: its board, time passed in every frame and inputs of the player.
+
+    The file starts with a header (magic, version, layout type, layout size, seed, tile size, whether shortest
+    path targeting is on), followed by 16-bit words. Every frame takes a single word: its time in ms (12 bits),
+    whether it is the first one after a pause (1 bit) and the direction chosen by the player (3 bits, 0 if none).
+    Words with all three direction bits set are controls, like a new game started from a menu, or checksums of
+    the game state (followed by a 32-bit value). All numbers are little endian.
+    """
+    MAGIC = b'PMRP'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHBHHQBB')
+    WORD = struct.Struct('<H')
+    CHECKSUM_VALUE = struct.Struct('<I')
+    LAYOUT_TYPES = ['classic', 'prim', 'wall']
+
+    FRAME_TIME_MASK = 0x0fff
+    RESUMED_BIT = 0x1000
+    DIRECTION_SHIFT = 13
+    CONTROL = 7
+
+    # kinds of control words
+    CHECKSUM = 0
+    NEW_GAME = 1
+    NEXT_LEVEL = 2
+
+    CHECKSUM_FRAMES = 90  # the state is checked about once per second of the game
+
+    def __init__(self, layout, tile_size, shortest_path_targeting=False):
+        self.header = ReplayRecorder.HEADER.pack(
+            ReplayRecorder.MAGIC, ReplayRecorder.VERSION, ReplayRecorder.layout_type_index(layout),
+            layout.layout_size[0], layout.layout_size[1], getattr(layout, 'seed', None) or 0, tile_size,
+            shortest_path_targeting)
+        self.data = bytearray()
+        self.frames = 0
+
+    @staticmethod
+    def layout_type_index(layout):
+        if isinstance(layout, board.ClassicLayout):
+            return 0
+        return ReplayRecorder.LAYOUT_TYPES.index(layout.type)
+
+    @staticmethod
+    def recordable(layout):
+        # generated layouts can only be recreated from their seeds
+        return isinstance(layout, board.ClassicLayout) or \
+            (isinstance(layout, board.GeneratedLayout) and layout.seed is not None)
+
+    def record_frame(self, frame_time, direction, resumed):
+        frame_time_ms = min(int(round(frame_time * game.Game.TICKS_PER_SEC)), ReplayRecorder.FRAME_TIME_MASK)
+        word = frame_time_ms | (ReplayRecorder.RESUMED_BIT if resumed else 0)
+        if direction is not None:
+            word |= direction.value << ReplayRecorder.DIRECTION_SHIFT
+        self.data += ReplayRecorder.WORD.pack(word)
+        self.frames += 1
+
+    def record_control(self, kind):
+        self.data += ReplayRecorder.WORD.pack(ReplayRecorder.CONTROL << ReplayRecorder.DIRECTION_SHIFT | kind)
+
+    def record_checksum(self, checksum):
+        self.record_control(ReplayRecorder.CHECKSUM)
+        self.data += ReplayRecorder.CHECKSUM_VALUE.pack(checksum)
+
+    def checksum_due(self):
+        return self.frames % ReplayRecorder.CHECKSUM_FRAMES == 0
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as replay_file:
+            replay_file.write(self.header)
+            replay_file.write(self.data)
+
+
+class Replay(object):
+    """Game recorded by the replay recorder, read from a file"""
+    FRAME = 'frame'
+    CHECKSUM = 'checksum'
+    NEW_GAME = 'new game'
+    NEXT_LEVEL = 'next level'
+    CONTROLS = {ReplayRecorder.NEW_GAME: NEW_GAME, ReplayRecorder.NEXT_LEVEL: NEXT_LEVEL}
+
+    def __init__(self, path):
+        with open(path, 'rb') as replay_file:
+            self.data = replay_file.read()
+
+        if len(self.data) < ReplayRecorder.HEADER.size:
+            raise ValueError('%s is not a replay' % path)
+        magic, version, layout_type, width, height, self.seed, self.tile_size, shortest_path_targeting = \
+            ReplayRecorder.HEADER.unpack_from(self.data, 0)
+        if magic != ReplayRecorder.MAGIC or version != ReplayRecorder.VERSION:
+            raise ValueError('%s is not a replay (version %d)' % (path, ReplayRecorder.VERSION))
+
+        self.layout_type = ReplayRecorder.LAYOUT_TYPES[layout_type]
+        self.layout_size = (width, height)
+        self.shortest_path_targeting = bool(shortest_path_targeting)
+
+    def layout(self):
+        if self.layout_type == 'classic':
+            return board.ClassicLayout()
+        return board.GeneratedLayout(self.layout_type, self.layout_size, self.seed)
+
+    def records(self):
+        """Yields recorded (kind, value) pairs, values of frames are (frame time, direction, resumed) tuples"""
+        offset = ReplayRecorder.HEADER.size
+        while offset + ReplayRecorder.WORD.size <= len(self.data):
+            word, = ReplayRecorder.WORD.unpack_from(self.data, offset)
+            offset += ReplayRecorder.WORD.size
+
+            direction_value = word >> ReplayRecorder.DIRECTION_SHIFT
+            if direction_value != ReplayRecorder.CONTROL:
+                frame_time = (word & ReplayRecorder.FRAME_TIME_MASK) / game.Game.TICKS_PER_SEC
+                direction = Directions(direction_value) if direction_value else None
+                yield Replay.FRAME, (frame_time, direction, bool(word & ReplayRecorder.RESUMED_BIT))
+            elif word & ReplayRecorder.FRAME_TIME_MASK == ReplayRecorder.CHECKSUM:
+                checksum, = ReplayRecorder.CHECKSUM_VALUE.unpack_from(self.data, offset)
+                offset += ReplayRecorder.CHECKSUM_VALUE.size
+                yield Replay.CHECKSUM, checksum
+            else:
+                yield Replay.CONTROLS[word & ReplayRecorder.FRAME_TIME_MASK], None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Plays a recorded game and checks that it plays the same way.')
+    parser.add_argument('replay', help='file saved by the game (F5 or closing the window)')
+    parser.add_argument('--headless', action='store_true',
+                        help='plays without a window, as fast as possible (e.g. to profile the game)')
+    parser.add_argument('--export-profile', action='store_true', help='saves frame times, like F4 in the game')
+    parser.add_argument('--capture', default=None, metavar='TARGET',
+                        help="saves played frames: as images (for paths like 'frames/%%05d.png'), piped to an encoder "
+                             "('|command', where {width}, {height} and {fps} are replaced) or as raw RGB (other paths)")
+    arguments = parser.parse_args(argv)
+
+    if arguments.headless:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    pygame.init()
+    screen = pygame.display.set_mode(game.SCREEN_RESOLUTION)
+
+    recorded = Replay(arguments.replay)
+    replayed = game.Game(screen, pygame.time.Clock(), recorded.tile_size, recorded.layout(),
+                         recorded.shortest_path_targeting)
+
+    if arguments.capture:
+        # headless replays wait for frames to be written, so that none of them is missing
+        replayed.start_capture(arguments.capture, drop_frames=not arguments.headless)
+
+    start = time.perf_counter()
+    frames, diverged_frame = replayed.play_replay(recorded, realtime=not arguments.headless)
+    elapsed = time.perf_counter() - start
+
+    sys.stdout.write('%d frames played in %.2f s\n' % (frames, elapsed))
+    frame_capture = replayed.compositor.capture
+    replayed.end_capture()  # errors of the capture are reported by the game
+    if replayed.capture_error is not None:
+        return 1
+    if frame_capture is not None:
+        sys.stdout.write('%d frames captured, %d dropped\n' % (frame_capture.captured, frame_capture.dropped))
+    for name, p50, p99 in replayed.profiler.summary():
+        sys.stdout.write('  %-16s p50 %7.3f ms  p99 %7.3f ms\n' % (name, p50, p99))
+    if arguments.export_profile:
+        replayed.export_profile()
+
+    if diverged_frame is not None:
+        sys.stdout.write('the game diverged from the recording at frame %d\n' % diverged_frame)
+        return 1
+    sys.stdout.write('the game played as recorded\n')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import board
+import game
+from characters import Pacman
+from collectibles import DotField
+from ghosts import Blinky, Clyde, GhostNames, Inky, Pinky
+
+
+class Simulation(game.GameRules):
+    """Headless game core, advanced manually with a fixed time step. Never touches the display."""
+    DEFAULT_DT = game.Game.STEP_DT
+
+    def __init__(self, layout, tile_size=game.TILE_SIZE, dt=DEFAULT_DT, shortest_path_targeting=False):
+        self.dt = dt
+        self.ticks = 0.0  # simulated time, in ms
+        self.frame = 0
+        self.game_over = False
+
+        self.board = board.Board(tile_size, None, layout, shortest_path_targeting)
+        self.board.get_ticks = self.get_ticks
+        self.status = game.GameStatus(self.get_ticks)
+
+        self.player = Pacman(self.board)
+        self.monsters = {
+            GhostNames.inky: Inky(self.board),
+            GhostNames.pinky: Pinky(self.board),
+            GhostNames.blinky: Blinky(self.board),
+            GhostNames.clyde: Clyde(self.board)
+        }
+
+        self.dots = DotField(self.board)
+        self.dots_eaten = 0
+
+    def reset(self):
+        """Starts a new game on the same board, without rebuilding the board or characters"""
+        self.ticks = 0.0
+        self.frame = 0
+        self.game_over = False
+        self.dots_eaten = 0
+        self.status.reset()
+
+        self.player.last_teleport_time = 0
+        for ghost in self.monsters.values():
+            ghost.last_teleport_time = 0
+            ghost.direction_change_time = 0
+        self.advance_to_next_level()
+        self.player.is_running = True
+
+    def get_ticks(self):
+        return int(self.ticks)
+
+    def step(self, direction=None, dt=None):
+        """Advances the game by a single frame, optionally trying to turn pacman into given direction"""
+        if self.game_over:
+            return
+
+        dt = self.dt if dt is None else dt
+        self.ticks += dt * game.Game.TICKS_PER_SEC
+        self.frame += 1
+
+        self.play_step(dt, direction)
+
+    def run(self, policy, frames):
+        """Runs the simulation for given number of frames (or until game over), asking policy for directions"""
+        for _ in range(frames):
+            if self.game_over:
+                break
+            self.step(policy(self))
+
+    def end_game(self):
+        self.game_over = True
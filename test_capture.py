@@ -0,0 +1,71 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+import capture
+
+
+class FrameCaptureTest(unittest.TestCase):
+    SIZE = (70, 45)  # odd sizes of rows, so they are padded in 24-bit surfaces
+    FRAMES = 5
+
+    @classmethod
+    def setUpClass(cls):
+        pygame.init()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.screen = pygame.Surface(FrameCaptureTest.SIZE)
+        self.generator = random.Random(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def capture_frames(self, target):
+        """Captures frames drawn with random rectangles, returns the RGB pixels of the drawn frames"""
+        output = capture.open_output(target, FrameCaptureTest.SIZE, 90)
+        frame_capture = capture.FrameCapture(self.screen, output, drop_frames=False)
+        drawn = []
+        for _ in range(FrameCaptureTest.FRAMES):
+            for _ in range(10):
+                color = [self.generator.randrange(256) for _ in range(3)]
+                rect = [self.generator.randrange(size) for size in FrameCaptureTest.SIZE * 2]
+                self.screen.fill(color, rect)
+            frame_capture.capture_frame()
+            drawn.append(pygame.image.tobytes(self.screen, 'RGB'))
+        frame_capture.close()
+        self.assertEqual((frame_capture.captured, frame_capture.dropped), (FrameCaptureTest.FRAMES, 0))
+        return drawn
+
+    def test_raw_video_equals_the_screen(self):
+        path = os.path.join(self.directory, 'capture.rgb')
+        drawn = self.capture_frames(path)
+        with open(path, 'rb') as raw_file:
+            self.assertEqual(raw_file.read(), b''.join(drawn))
+
+    def test_images_equal_the_screen(self):
+        pattern = os.path.join(self.directory, 'frames', '%03d.png')
+        drawn = self.capture_frames(pattern)
+        for number, pixels in enumerate(drawn):
+            image = pygame.image.load(pattern % number)
+            self.assertEqual(image.get_size(), FrameCaptureTest.SIZE)
+            self.assertEqual(pygame.image.tobytes(image, 'RGB'), pixels)
+
+    def test_failed_writes_are_raised(self):
+        frame_capture = capture.FrameCapture(self.screen, capture.open_output('|true', FrameCaptureTest.SIZE, 90),
+                                             drop_frames=False)
+        with self.assertRaises(capture.CaptureError):
+            # the encoder exits right away, frames can not be written to it
+            for _ in range(capture.FrameCapture.BUFFERS * 100):
+                frame_capture.capture_frame()
+            frame_capture.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+
+import board
+from environment import BatchEnvironment, Observations
+
+
+def rebuilt_observation(layout, simulation, game_index):
+    """Observation of a game of the batch simulation, built from scratch"""
+    width, height = layout.layout_size
+    padding = board.BoardLayout.GRID_PADDING
+    observation = np.zeros((Observations.CHANNELS, height, width), dtype=np.uint8)
+
+    def layout_grid(cells):
+        grid = np.asarray(cells).reshape(layout.grid_height, layout.grid_width)
+        return grid[padding:padding + height, padding:padding + width]
+
+    observation[Observations.WALLS] = layout_grid(bytearray(layout.tile_grid)) & board.BoardLayout.TILE_WALL != 0
+    observation[Observations.DOTS] = layout_grid(simulation.dots[game_index])
+    observation[Observations.BIG_DOTS] = layout_grid(simulation.big_dots[game_index])
+    for entity, (x, y) in enumerate(simulation.tiles[game_index].astype(int)):
+        if 0 <= x < width and 0 <= y < height:
+            observation[Observations.PACMAN + entity, y, x] = 1
+            if entity > 0 and not simulation.ghosts_killing[game_index, entity - 1]:
+                observation[Observations.VULNERABLE, y, x] += 1
+    return observation
+
+
+class BatchEnvironmentTest(unittest.TestCase):
+    BATCH_SIZE = 4
+    FRAMES = 3000
+
+    def play(self, layout):
+        environment = BatchEnvironment(layout, BatchEnvironmentTest.BATCH_SIZE)
+        random = np.random.default_rng(0)
+        resets = 0
+        for frame in range(BatchEnvironmentTest.FRAMES):
+            observations, _, dones = environment.step(random.integers(0, 5, BatchEnvironmentTest.BATCH_SIZE))
+            if dones.any():
+                environment.reset(dones)  # the array returned by step, as a training loop would pass it
+                resets += 1
+            for game_index in range(BatchEnvironmentTest.BATCH_SIZE):
+                expected = rebuilt_observation(layout, environment.simulation, game_index)
+                self.assertTrue(np.array_equal(observations[game_index], expected),
+                                'observation of game %d differs at frame %d' % (game_index, frame))
+        return resets
+
+    def test_observations_after_resets_with_done_flags(self):
+        for layout in [board.ClassicLayout(), board.GeneratedLayout('prim', seed=3)]:
+            self.assertGreater(self.play(layout), 0)  # the scenario has to reset games
+
+
+if __name__ == '__main__':
+    unittest.main()
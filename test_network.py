@@ -0,0 +1,50 @@
+import os
+import random
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import board
+import network
+from characters import Directions
+from simulation import Simulation
+
+
+class SnapshotTest(unittest.TestCase):
+    STEPS = 6000
+
+    def test_received_state_equals_the_hosted_game(self):
+        hosted = Simulation(board.ClassicLayout())
+        hosted.reset()
+        shown = Simulation(board.ClassicLayout())  # its board and characters show the received state
+        shown_characters = [shown.player] + list(shown.monsters.values())
+
+        encoder = network.SnapshotEncoder(hosted)
+        view = network.RemoteView(shown.dots, len(shown_characters))
+        generator = random.Random(0)
+        resets = 0
+        for step in range(SnapshotTest.STEPS):
+            if hosted.game_over:
+                hosted.reset()  # all the dots are put back, as on the next level
+                resets += 1
+            hosted.step(generator.choice(list(Directions)) if step % 30 == 0 else None)
+            if step % network.SNAPSHOT_STEPS:
+                continue
+
+            snapshot = encoder.encode(step)
+            if snapshot is not None:
+                view.apply(snapshot, 0.0)
+            view.update_characters(shown_characters)
+
+            self.assertEqual(bytes(shown.dots.dots), bytes(hosted.dots.dots), 'dots differ at step %d' % step)
+            for shown_character, character in zip(shown_characters, encoder.characters):
+                self.assertEqual((shown_character.position, shown_character.direction, shown_character.is_killing),
+                                 (character.position, character.direction, character.is_killing),
+                                 'characters differ at step %d' % step)
+            self.assertEqual(view.status[:3], (hosted.status.player_points, hosted.status.level_number,
+                                               hosted.status.player_lives))
+        self.assertGreater(resets, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
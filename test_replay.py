@@ -0,0 +1,78 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+import board
+import game
+import replay
+from characters import Directions
+
+
+class ReplayTest(unittest.TestCase):
+    FRAMES = 1200
+    FRAME_TIMES = [0.008, 0.011, 0.017]  # measured in whole ms, as by the clock of the game
+
+    @classmethod
+    def setUpClass(cls):
+        pygame.init()
+        cls.screen = pygame.display.set_mode(game.SCREEN_RESOLUTION)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def new_game(self, layout):
+        played = game.Game(ReplayTest.screen, pygame.time.Clock(), game.TILE_SIZE, layout)
+        played.status.show_menus = False
+        return played
+
+    def record(self, layout, seed):
+        """Plays random frames and inputs like the main loop of the game does, returns the path of the recording"""
+        recorded = self.new_game(layout)
+        generator = random.Random(seed)
+        for frame in range(ReplayTest.FRAMES):
+            frame_time = generator.choice(ReplayTest.FRAME_TIMES)
+            recorded.input_direction = generator.choice([None] + list(Directions)) if frame % 20 == 0 \
+                else recorded.input_direction
+            recorded.recorder.record_frame(frame_time, recorded.input_direction, frame == 0)
+            recorded.simulate_frame(frame_time, frame == 0)
+            if recorded.recorder.checksum_due():
+                recorded.recorder.record_checksum(recorded.state_checksum())
+            recorded.is_special_communique_set = False  # no countdown after deaths
+
+        path = os.path.join(self.directory, 'recorded.pmr')
+        recorded.recorder.save(path)
+        return path
+
+    def replay(self, path):
+        recorded = replay.Replay(path)
+        return self.new_game(recorded.layout()).play_replay(recorded, realtime=False)
+
+    def test_replayed_games_match_recorded_checksums(self):
+        for layout in [board.ClassicLayout(), board.GeneratedLayout('prim', seed=5)]:
+            frames, diverged_frame = self.replay(self.record(layout, 1))
+            self.assertEqual(frames, ReplayTest.FRAMES)
+            self.assertIsNone(diverged_frame)
+
+    def test_changed_frame_times_are_detected(self):
+        path = self.record(board.ClassicLayout(), 2)
+        with open(path, 'rb') as replay_file:
+            data = bytearray(replay_file.read())
+
+        # the second frame takes longer than a step more than it did (frame times in ms are the low bits of words)
+        data[replay.ReplayRecorder.HEADER.size + replay.ReplayRecorder.WORD.size] += 12
+        with open(path, 'wb') as replay_file:
+            replay_file.write(data)
+        self.assertIsNotNone(self.replay(path)[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
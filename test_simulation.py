@@ -0,0 +1,68 @@
+import os
+import random
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+import board
+import game
+from characters import Directions
+from simulation import Simulation
+
+
+def game_state(played):
+    """State of the rules of a game (shown or simulated) compared step by step"""
+    characters = [played.player] + [played.monsters.get(name) for name in game.GhostNames]
+    return ([(character.position, character.direction, character.speed, character.is_killing)
+             for character in characters],
+            played.dots.dots_left, played.dots.big_dots_left, played.status.level_number,
+            played.status.player_points, played.status.player_lives, played.status.killing_activated_time)
+
+
+class GameSimulationTest(unittest.TestCase):
+    STEPS = 6000
+    TURN_STEPS = 40  # pacman keeps every direction for that many steps
+
+    @classmethod
+    def setUpClass(cls):
+        pygame.init()
+        cls.screen = pygame.display.set_mode(game.SCREEN_RESOLUTION)
+
+    def play(self, layout_factory, directions):
+        shown = game.Game(GameSimulationTest.screen, pygame.time.Clock(), game.TILE_SIZE, layout_factory())
+        shown.status.show_menus = False
+        shown.player.is_running = True
+        simulated = Simulation(layout_factory())
+        simulated.reset()
+
+        deaths = 0
+        for step in range(GameSimulationTest.STEPS):
+            direction = directions[(step // GameSimulationTest.TURN_STEPS) % len(directions)]
+            lives = shown.status.player_lives
+            shown.input_direction = direction
+            shown.step()
+            simulated.step(direction)
+            deaths += lives - shown.status.player_lives
+            self.assertEqual(game_state(shown), game_state(simulated), 'the games differ at step %d' % step)
+            if shown.pause or simulated.game_over:
+                break
+        return deaths
+
+    def test_game_plays_by_the_rules_of_simulation(self):
+        directions = [Directions.LEFT, Directions.UP, Directions.RIGHT, Directions.DOWN]
+        layouts = [board.ClassicLayout, lambda: board.GeneratedLayout('prim', seed=3),
+                   lambda: board.GeneratedLayout('wall', seed=3)]
+        for layout_factory in layouts:
+            self.assertGreater(self.play(layout_factory, directions), 0)  # deaths are where the rules differed
+
+    def test_no_dots_eaten_when_pacman_is_killed(self):
+        # pacman gets killed on a step it would eat a dot at step 1706 of these directions
+        generator = random.Random(49)
+        directions = [generator.choice(list(Directions)) for _ in range(200)]
+        self.assertGreater(self.play(board.ClassicLayout, directions), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
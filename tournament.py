@@ -0,0 +1,120 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import sys
+from collections import defaultdict
+
+import board
+import policies
+from simulation import Simulation
+
+# simulations built by a worker process, one per layout (board is built once and reused between games)
+simulations_cache = {}
+
+
+def load_policy(name):
+    """Finds a policy class by its name, or by a 'module:attribute' path for custom policies"""
+    if name in policies.POLICIES:
+        return policies.POLICIES[name]
+    module_name, attribute = name.split(':')
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def prepare_simulation(layout_type, seed, shortest_path_targeting=False):
+    # the classic board does not depend on the seed, so it is shared by all the tasks of a worker
+    key = (layout_type, None if layout_type == 'classic' else seed, shortest_path_targeting)
+    if key not in simulations_cache:
+        if layout_type == 'classic':
+            layout = board.ClassicLayout()
+        else:
+            layout = board.GeneratedLayout(layout_type, seed=seed)
+        simulations_cache[key] = Simulation(layout, shortest_path_targeting=shortest_path_targeting)
+    return simulations_cache[key]
+
+
+def run_task(task):
+    layout_type, seed, games, policy_name, max_frames, shortest_path_targeting = task
+    simulation = prepare_simulation(layout_type, seed, shortest_path_targeting)
+    policy_class = load_policy(policy_name)
+
+    results = []
+    for game_number in range(games):
+        simulation.reset()
+        simulation.run(policy_class(seed * games + game_number), max_frames)
+        results.append({
+            'layout': layout_type,
+            'seed': seed,
+            'game': game_number,
+            'policy': policy_name,
+            'shortest_path_targeting': shortest_path_targeting,
+            'score': simulation.status.player_points,
+            'survival_time': simulation.ticks / 1000.0,
+            'dots_eaten': simulation.dots_eaten,
+            'levels': simulation.status.level_number,
+            'game_over': simulation.game_over
+        })
+
+    # generated boards are not reused, there is no point in keeping them
+    if layout_type != 'classic':
+        del simulations_cache[(layout_type, seed, shortest_path_targeting)]
+    return results
+
+
+def prepare_tasks(arguments):
+    # on the classic layout seeds only change the policies
+    return [(layout_type, seed, arguments.games, arguments.policy, arguments.max_frames,
+             arguments.shortest_path_targeting)
+            for layout_type in arguments.layouts
+            for seed in range(arguments.first_seed, arguments.first_seed + arguments.seeds)]
+
+
+def print_summary(totals, stream):
+    for layout_type, total in totals.items():
+        count = total['games']
+        stream.write('%s: %d games, avg score %.1f, avg survival %.1f s, avg dots %.1f, avg levels %.2f\n' % (
+            layout_type, count, total['score'] / count, total['survival_time'] / count,
+            total['dots_eaten'] / count, total['levels'] / count))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs many headless games in parallel and collects their results.')
+    parser.add_argument('--layouts', nargs='+', default=['classic', 'prim', 'wall'],
+                        choices=['classic', 'prim', 'wall'])
+    parser.add_argument('--seeds', type=int, default=100, help='number of seeds played on every layout')
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--games', type=int, default=1, help='number of games played with every seed')
+    parser.add_argument('--policy', default='greedy', help="one of: %s, or 'module:attribute'" %
+                                                          ', '.join(policies.POLICIES))
+    parser.add_argument('--max-frames', type=int, default=int(600 / Simulation.DEFAULT_DT),
+                        help='frames after which an unfinished game is stopped')
+    parser.add_argument('--shortest-path-targeting', action='store_true',
+                        help='ghosts chase their targets along shortest paths, e.g. to compare it with the default')
+    parser.add_argument('--processes', type=int, default=None, help='defaults to the number of cores')
+    parser.add_argument('--output', default='tournament_results.jsonl',
+                        help="file for results (JSON lines), '-' for standard output")
+    arguments = parser.parse_args(argv)
+
+    tasks = prepare_tasks(arguments)
+    output = sys.stdout if arguments.output == '-' else open(arguments.output, 'w')
+    totals = defaultdict(lambda: defaultdict(float))
+    try:
+        with multiprocessing.Pool(arguments.processes) as pool:
+            # results are written as soon as every task is finished
+            for task_results in pool.imap_unordered(run_task, tasks):
+                for result in task_results:
+                    output.write(json.dumps(result) + '\n')
+                    total = totals[result['layout']]
+                    total['games'] += 1
+                    for key in ['score', 'survival_time', 'dots_eaten', 'levels']:
+                        total[key] += result[key]
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print_summary(totals, sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class Viewport(object):
+    """Camera showing a screen-sized part of the board, kept centered on a followed position when possible"""
+
+    def __init__(self, size, board):
+        self.board = board
+        self.rect = pygame.Rect((0, 0), size)
+        self.world_rect = pygame.Rect(0, 0,
+                                      board.board_layout.layout_size[0] * board.tile_size,
+                                      board.board_layout.layout_size[1] * board.tile_size)
+
+    def follow(self, position):
+        self.rect.center = (int(position[0]), int(position[1]))
+        self.rect.clamp_ip(self.world_rect)
+
+    def offset(self):
+        # translation from board to screen coordinates
+        return -self.rect.x, -self.rect.y
+
+    def visible_tiles(self, margin=0):
+        """Rectangle of tiles (extended by margin tiles) overlapping the viewport"""
+        tile_size = self.board.tile_size
+        left = self.rect.left // tile_size - margin
+        top = self.rect.top // tile_size - margin
+        right = (self.rect.right - 1) // tile_size + 1 + margin
+        bottom = (self.rect.bottom - 1) // tile_size + 1 + margin
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+
+class ChunkedBackground(object):
+    """Background of a board too large for a single surface, rendered lazily in square chunks of tiles"""
+    CHUNK_TILES = 16
+    EVICTION_DISTANCE = 2  # chunks further than that (in chunks) from the viewport are dropped
+    MAX_CHUNKS = 64
+
+    def __init__(self, board, chunk_tiles=CHUNK_TILES):
+        self.board = board
+        self.chunk_tiles = chunk_tiles
+        self.chunk_size = chunk_tiles * board.tile_size
+        self.chunks = OrderedDict()
+
+    def chunk(self, key):
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = pygame.Surface((self.chunk_size, self.chunk_size))
+            tiles_rect = pygame.Rect(key[0] * self.chunk_tiles, key[1] * self.chunk_tiles,
+                                     self.chunk_tiles, self.chunk_tiles)
+            self.board.draw_background_tiles(chunk, tiles_rect)
+            self.chunks[key] = chunk
+        else:
+            self.chunks.move_to_end(key)
+        return chunk
+
+    def visible_chunks(self, viewport):
+        return range(viewport.rect.left // self.chunk_size, (viewport.rect.right - 1) // self.chunk_size + 1), \
+            range(viewport.rect.top // self.chunk_size, (viewport.rect.bottom - 1) // self.chunk_size + 1)
+
+    def draw(self, surface, viewport):
+        """Draws the part of background seen through the viewport, surface corresponds to the viewport area"""
+        columns, rows = self.visible_chunks(viewport)
+        for x in columns:
+            for y in rows:
+                surface.blit(self.chunk((x, y)), (x * self.chunk_size - viewport.rect.x,
+                                                  y * self.chunk_size - viewport.rect.y))
+        self.evict_far_chunks(columns, rows)
+
+    def evict_far_chunks(self, columns, rows):
+        distance = ChunkedBackground.EVICTION_DISTANCE
+        for (x, y) in list(self.chunks.keys()):
+            if x < columns.start - distance or x >= columns.stop + distance or \
+                    y < rows.start - distance or y >= rows.stop + distance:
+                del self.chunks[(x, y)]
+
+        while len(self.chunks) > ChunkedBackground.MAX_CHUNKS:
+            self.chunks.popitem(last=False)